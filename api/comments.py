@@ -1 +1,31 @@
-# Placeholder for api/comments.py
+from flask import current_app, request, jsonify
+
+from feed import recap_api
+from services.recap_moderation import moderator
+
+# -------------------- COMMENT ROUTES --------------------
+@recap_api.route("/api/recap/<int:recap_id>/comments", methods=["POST"])
+def add_comment(recap_id):
+    supabase = current_app.extensions["supabase"]
+    data = request.json
+    try:
+        verdict = moderator.score(data["content"])
+        if verdict["flagged"]:
+            return jsonify({"error": "Comment rejected by moderation", "moderation": verdict}), 422
+        result = supabase.table("comments").insert({
+            "recap_id": recap_id,
+            "user_id": data["user_id"],
+            "content": data["content"]
+        }).execute()
+        return jsonify({"message": "Comment added", "comment": result.data[0]}), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@recap_api.route("/api/recap/<int:recap_id>/comments", methods=["GET"])
+def get_comments(recap_id):
+    supabase = current_app.extensions["supabase"]
+    try:
+        result = supabase.table("comments").select("*").eq("recap_id", recap_id).order("id").execute()
+        return jsonify(result.data), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
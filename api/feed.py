@@ -1 +1,25 @@
-# Placeholder for api/feed.py
+from flask import current_app, request, jsonify
+
+from feed import recap_api
+from services import recap_utils
+
+MAX_FEED_LIMIT = 100
+
+# -------------------- FEED ROUTES --------------------
+@recap_api.route("/api/feed/<int:user_id>", methods=["GET"])
+def get_feed(user_id):
+    try:
+        limit = int(request.args.get("limit", 20))
+        cursor = int(request.args["cursor"]) if request.args.get("cursor") else None
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers"}), 400
+    if limit < 1 or limit > MAX_FEED_LIMIT:
+        return jsonify({"error": "limit must be between 1 and %d" % MAX_FEED_LIMIT}), 400
+
+    supabase = current_app.extensions["supabase"]
+    try:
+        recap_ids, next_cursor = recap_utils.read_feed(supabase, user_id, cursor, limit)
+        items = recap_utils.fetch_recaps(supabase, recap_ids)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"items": items, "next_cursor": next_cursor}), 200
@@ -1 +1,32 @@
-# Placeholder for api/moderation.py
+import os
+
+from flask import request, jsonify
+
+from feed import recap_api
+from services.recap_moderation import moderator
+
+MAX_BATCH_TEXTS = int(os.environ.get("MODERATION_MAX_BATCH", "500"))
+
+# -------------------- MODERATION ROUTES --------------------
+@recap_api.route("/api/moderation/score", methods=["POST"])
+def score_texts():
+    data = request.json or {}
+    texts = data.get("texts")
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({"error": "texts must be a list of strings"}), 400
+    if len(texts) > MAX_BATCH_TEXTS:
+        return jsonify({"error": "At most %d texts per request" % MAX_BATCH_TEXTS}), 400
+    try:
+        return jsonify({"results": moderator.score_many(texts)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@recap_api.route("/api/moderation/reload", methods=["POST"])
+def reload_terms():
+    try:
+        terms = moderator.reload()
+        if moderator.skipped:
+            return jsonify({"error": "Some term lines were skipped", "skipped": moderator.skipped, "terms": terms}), 422
+        return jsonify({"message": "Terms reloaded", "terms": terms}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1 +1,67 @@
-# Placeholder for api/recap.py
+import logging
+
+from flask import current_app, request, jsonify
+
+from feed import recap_api
+from services import recap_utils, recap_webhooks
+from services.emoji_tracker import emoji_tracker
+from services.recap_moderation import moderator
+from services.recap_timeline import timelines
+
+log = logging.getLogger(__name__)
+
+MAX_RECAP_ID = 2 ** 63 - 1  # bigint
+
+# -------------------- RECAP ROUTES --------------------
+@recap_api.route("/api/recap", methods=["POST"])
+def create_recap():
+    supabase = current_app.extensions["supabase"]
+    data = request.json
+    try:
+        verdict = moderator.score(data["content"])
+        if verdict["flagged"]:
+            return jsonify({"error": "Recap rejected by moderation", "moderation": verdict}), 422
+        result = supabase.table("recaps").insert({
+            "user_id": data["user_id"],
+            "content": data["content"],
+            "image": data.get("image")
+        }).execute()
+        recap = result.data[0]
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    # From here on the recap is saved: failures are logged, not returned, so a
+    # client retry doesn't insert it twice.
+    try:
+        followers, high_follower = recap_utils.follower_ids(supabase, recap["user_id"])
+        timelines.publish(recap["id"], recap["user_id"], followers, high_follower)
+    except Exception:
+        # Timelines built before this pick the recap up on their next rebuild.
+        log.exception("Failed to fan out recap %s to timelines", recap["id"])
+    try:
+        recap_webhooks.enqueue("recap.created", recap)
+    except Exception:
+        log.exception("Failed to queue recap.created webhook for recap %s", recap["id"])
+    return jsonify({"message": "Recap created", "recap": recap}), 201
+
+@recap_api.route("/api/recap/<int:recap_id>/reactions", methods=["POST"])
+def add_reaction(recap_id):
+    data = request.json or {}
+    emoji = data.get("emoji")
+    if not isinstance(emoji, str) or not emoji or len(emoji) > 32:
+        return jsonify({"error": "emoji must be a non-empty string of at most 32 characters"}), 400
+    # Checked before buffering: a delta for a missing recap would fail its whole flush.
+    try:
+        exists = recap_id <= MAX_RECAP_ID and emoji_tracker.recap_exists(recap_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if not exists:
+        return jsonify({"error": "Recap not found"}), 404
+    emoji_tracker.react(recap_id, emoji)
+    return jsonify({"message": "Reaction recorded"}), 202
+
+@recap_api.route("/api/recap/<int:recap_id>/reactions", methods=["GET"])
+def get_reactions(recap_id):
+    try:
+        return jsonify(emoji_tracker.counts(recap_id)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1 +1,37 @@
-# Placeholder for api/tasks.py
+from flask import request, jsonify
+
+from feed import recap_api
+from services import recap_webhooks
+
+# -------------------- TASK ROUTES --------------------
+@recap_api.route("/api/tasks/webhooks/stats", methods=["GET"])
+def webhook_stats():
+    try:
+        return jsonify(recap_webhooks.get_queue().stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@recap_api.route("/api/tasks/webhooks/dead", methods=["GET"])
+def dead_webhooks():
+    try:
+        limit = int(request.args.get("limit", 100))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if limit < 1 or limit > 1000:
+        return jsonify({"error": "limit must be between 1 and 1000"}), 400
+    try:
+        return jsonify({"events": recap_webhooks.get_queue().dead(limit)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@recap_api.route("/api/tasks/webhooks/dead/requeue", methods=["POST"])
+def requeue_dead_webhooks():
+    data = request.get_json(silent=True) or {}
+    ids = data.get("ids")
+    valid = ids is None or (isinstance(ids, list) and all(type(i) is int for i in ids))
+    if not valid:
+        return jsonify({"error": "ids must be a list of integers"}), 400
+    try:
+        return jsonify({"requeued": recap_webhooks.get_queue().requeue_dead(ids)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import re
+import time
+from urllib.parse import parse_qs
+
+from services import metrics, order_events, product_listing
+from services.async_postgrest import ConfigError, RouteBusy, UpstreamTimeout, limiter, postgrest
+from services.catalog_cache import catalog_cache
+
+# Async entry point. The hot read routes are served natively on the event loop
+# through a shared PostgREST connection pool; every other route falls through
+# to the Flask app in main.py, which is only imported on first use.
+#
+#   gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+#   uvicorn asgi:app --workers 4
+
+STATUS_HISTORY_PATH = re.compile(r"^/api/order/(\d+)/status-history$")
+# Same route labels as the Flask rules, so /metrics reads the same under both servers.
+ROUTE_RULES = {
+    "products": "/api/products",
+    "status_history": "/api/order/<int:order_id>/status-history",
+    "status_events": "/api/orders/status-events",
+}
+
+_flask_app = None
+
+
+def flask_app():
+    global _flask_app
+    if _flask_app is None:
+        from asgiref.wsgi import WsgiToAsgi
+        from main import app as wsgi_app
+        _flask_app = WsgiToAsgi(wsgi_app)
+    return _flask_app
+
+
+def query_args(scope):
+    parsed = parse_qs(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+    return {key: values[0] for key, values in parsed.items()}
+
+
+def request_header(scope, name):
+    name = name.lower().encode("latin-1")
+    for key, value in scope.get("headers", []):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag.strip('"') == etag:
+            return True
+    return False
+
+
+def cors_headers(scope):
+    # What flask_cors' CORS(app) in main.py sends, so browsers see no difference.
+    # Preflight OPTIONS requests fall through to Flask.
+    origin = request_header(scope, "origin")
+    if origin:
+        return [(b"access-control-allow-origin", origin.encode("latin-1")), (b"vary", b"Origin")]
+    return [(b"access-control-allow-origin", b"*")]
+
+
+async def send_body(send, status, body, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        + [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status, data):
+    await send_body(send, status, json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+
+# -------------------- PRODUCT ROUTES --------------------
+async def get_products(scope, send):
+    try:
+        query = product_listing.parse_listing_args(query_args(scope))
+    except ValueError as e:
+        return await send_json(send, 400, {"error": str(e)})
+
+    cache_key = product_listing.cache_key(query)
+    cached = catalog_cache.get(cache_key)
+    if cached is None:
+        version = catalog_cache.version()
+        rows = await postgrest.run(product_listing.listing_query(query))
+        body = product_listing.listing_body(rows, query)
+        etag = catalog_cache.put(cache_key, body, version)
+    else:
+        etag, body = cached
+
+    headers = [("etag", '"%s"' % etag), ("cache-control", "no-cache")]
+    if etag_matches(request_header(scope, "if-none-match"), etag):
+        await send({
+            "type": "http.response.start",
+            "status": 304,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+        })
+        return await send({"type": "http.response.body", "body": b""})
+    await send_body(send, 200, body, headers)
+
+
+# -------------------- ORDER ROUTES --------------------
+async def fetch_events(order_ids, since):
+    rows = await postgrest.run(order_events.events_query(order_ids, since))
+    return [order_events.to_wire(row) for row in rows]
+
+
+async def get_status_history(scope, send, order_id):
+    try:
+        since = order_events.parse_since(query_args(scope).get("since"))
+    except ValueError as e:
+        return await send_json(send, 400, {"error": str(e)})
+    if since is not None:
+        events = await fetch_events([order_id], since)
+        return await send_json(send, 200, order_events.envelope(events, since))
+    # Without since: the whole history, legacy column first, as a plain list.
+    rows = await postgrest.run(order_events.legacy_history_query(order_id))
+    if not rows:
+        return await send_json(send, 404, {"error": "Order not found"})
+    events, page_since = [], None
+    while True:
+        page = await fetch_events([order_id], page_since)
+        events.extend(page)
+        if len(page) < order_events.MAX_EVENTS_PER_READ:
+            break
+        page_since = page[-1]["seq"]
+    await send_json(send, 200, order_events.merge_legacy(rows[0]["status_history"], events))
+
+
+async def get_status_events(scope, send):
+    args = query_args(scope)
+    try:
+        order_ids = order_events.parse_order_ids(args.get("ids"))
+        since = order_events.parse_since(args.get("since"))
+    except ValueError as e:
+        return await send_json(send, 400, {"error": str(e)})
+    events = await fetch_events(order_ids, since)
+    await send_json(send, 200, order_events.envelope(events, since))
+
+
+def route(scope):
+    if scope["method"] != "GET":
+        return None
+    path = scope["path"]
+    if path == "/api/products":
+        return "products", get_products, ()
+    if path == "/api/orders/status-events":
+        return "status_events", get_status_events, ()
+    match = STATUS_HISTORY_PATH.match(path)
+    if match:
+        return "status_history", get_status_history, (int(match.group(1)),)
+    return None
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await postgrest.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    matched = route(scope)
+    if matched is None:
+        return await flask_app()(scope, receive, send)
+    name, handler, params = matched
+    start = time.perf_counter()
+    sent = {}
+
+    async def send_recording(message):
+        if message["type"] == "http.response.start":
+            sent["status"] = message["status"]
+            message = dict(message, headers=list(message["headers"]) + cors_headers(scope))
+        elif message["type"] == "http.response.body":
+            sent["bytes"] = sent.get("bytes", 0) + len(message.get("body", b""))
+        await send(message)
+
+    try:
+        await limiter.run(name, handler(scope, send_recording, *params))
+    except RouteBusy as e:
+        await send_json(send_recording, 503, {"error": str(e)})
+    except asyncio.TimeoutError:
+        await send_json(send_recording, 504, {"error": "Timed out"})
+    except UpstreamTimeout as e:
+        await send_json(send_recording, 504, {"error": str(e)})
+    except ConfigError as e:
+        await send_json(send_recording, 503, {"error": str(e)})
+    except Exception as e:
+        await send_json(send_recording, 500, {"error": str(e)})
+    finally:
+        metrics.observe_request(ROUTE_RULES[name], "GET", sent.get("status", 500),
+                                time.perf_counter() - start, 0, sent.get("bytes"))
@@ -0,0 +1,129 @@
+"""Route benchmarks against an in-process fake Supabase.
+
+    python -m benchmarks.bench_routes --latency 0.02 --requests 500 --concurrency 8
+
+Drives get_products (full list, first page and cursor pages), place_order and
+get_status_history (full and since=) through Flask's test client with every database call going to FakeSupabase, which sleeps --latency
+seconds per call. Prints per-route throughput, latency percentiles and
+Supabase calls per request. With --max-p95-ms the run exits non-zero when any
+route is slower than that, so it can gate CI.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_supabase import FakeSupabase
+
+# Cursors into the seeded catalog, filled in once products are seeded.
+CURSORS = []
+
+
+def load_app(fake, cache_ttl):
+    # main.py refuses to start without credentials; the real client is
+    # replaced before any request is made.
+    os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+    os.environ.setdefault("SUPABASE_KEY", "bench.bench.bench")
+    os.environ["CATALOG_CACHE_BACKEND"] = "memory"
+    os.environ["CATALOG_CACHE_TTL"] = str(cache_ttl)
+    import main
+    from services import metrics
+    from services.emoji_tracker import emoji_tracker
+
+    client = metrics.instrument_client(fake)
+    main.supabase = client
+    main.app.extensions["supabase"] = client
+    emoji_tracker.bind(client)
+    return main.app
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def supabase_calls():
+    from services import metrics
+    with metrics.supabase_duration._lock:
+        return sum(series[2] for series in metrics.supabase_duration._series.values())
+
+
+SCENARIOS = {
+    "get_products": lambda client, i: client.get("/api/products?limit=20"),
+    "get_products_all": lambda client, i: client.get("/api/products"),
+    "get_products_cursor": lambda client, i: client.get("/api/products?limit=20&cursor=%s" % CURSORS[i % len(CURSORS)]),
+    "place_order": lambda client, i: client.post("/api/order", json={"product_id": 1, "quantity": 1}),
+    "get_status_history": lambda client, i: client.get("/api/order/%d/status-history" % (i % 100 + 1)),
+    "get_status_history_since": lambda client, i: client.get(
+        "/api/order/%d/status-history?since=%d" % (i % 100 + 1, (i % 100) * 3 + 1)),
+}
+
+
+def run(app, name, requests, concurrency):
+    scenario = SCENARIOS[name]
+    latencies = []
+    errors = 0
+
+    def worker(offset):
+        nonlocal errors
+        client = app.test_client()
+        for i in range(offset, requests, concurrency):
+            start = time.perf_counter()
+            response = scenario(client, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    calls_before = supabase_calls()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "route": name,
+        "rps": requests / elapsed,
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "calls": (supabase_calls() - calls_before) / requests,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per fake Supabase call")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--requests", type=int, default=300, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--cache-ttl", type=float, default=30, help="catalog cache TTL; 0 disables it")
+    parser.add_argument("--routes", default=",".join(SCENARIOS))
+    parser.add_argument("--max-p95-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    fake = FakeSupabase(latency=args.latency, jitter=args.jitter)
+    fake.seed_products(args.products)
+    from services import product_listing
+    CURSORS.extend(product_listing.encode_cursor(row) for row in fake.tables["products"][::10])
+    fake.seed_orders(100, events_per_order=3)
+    app = load_app(fake, args.cache_ttl)
+
+    print("%-25s %9s %9s %9s %9s %11s %7s" % ("route", "req/s", "p50 ms", "p95 ms", "p99 ms", "db calls/req", "errors"))
+    failed = []
+    for name in args.routes.split(","):
+        result = run(app, name, args.requests, args.concurrency)
+        print("%-25s %9.1f %9.2f %9.2f %9.2f %11.2f %7d" % (
+            result["route"], result["rps"], result["p50"], result["p95"], result["p99"],
+            result["calls"], result["errors"]))
+        if result["errors"] or (args.max_p95_ms is not None and result["p95"] > args.max_p95_ms):
+            failed.append(name)
+
+    if failed:
+        print("FAILED: %s" % ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""How many database writes the emoji write-behind saves.
+
+    python -m benchmarks.emoji_writes --reactions 10000 --rate 5000
+
+Reactions arrive at --rate per second, spread over --recaps recaps with a
+skewed popularity (a few recaps get most taps) and --emojis emoji kinds. The
+tracker talks to a fake client that only counts calls, so the numbers show
+writes, not database speed.
+"""
+import argparse
+import random
+import time
+
+from services.emoji_tracker import EmojiTracker
+
+EMOJIS = ["🔥", "🌱", "😂", "❤️", "👏", "😮", "💯", "🙌"]
+
+
+class CountingClient:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.rows = 0
+
+    def rpc(self, name, params):
+        self.calls += 1
+        self.rows += len(params["deltas"])
+        return self
+
+    def execute(self):
+        if self.latency:
+            time.sleep(self.latency)
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reactions", type=int, default=10000)
+    parser.add_argument("--rate", type=float, default=5000, help="reactions per second")
+    parser.add_argument("--recaps", type=int, default=200)
+    parser.add_argument("--emojis", type=int, default=len(EMOJIS))
+    parser.add_argument("--max-pending", type=int, default=500)
+    parser.add_argument("--flush-interval", type=float, default=2.0)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per RPC")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    weights = [1.0 / (rank + 1) for rank in range(args.recaps)]
+    client = CountingClient(args.latency)
+    tracker = EmojiTracker(client, max_pending=args.max_pending, flush_interval=args.flush_interval)
+
+    start = time.perf_counter()
+    for i in range(args.reactions):
+        recap_id = rng.choices(range(1, args.recaps + 1), weights)[0]
+        tracker.react(recap_id, EMOJIS[rng.randrange(args.emojis)])
+        target = start + (i + 1) / args.rate
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    tracker.close()
+    elapsed = time.perf_counter() - start
+
+    saved = args.reactions - client.calls
+    print("reactions          %d over %.2fs" % (args.reactions, elapsed))
+    print("naive writes       %d (one insert per tap)" % args.reactions)
+    print("batched RPC calls  %d" % client.calls)
+    print("rows upserted      %d" % client.rows)
+    print("writes saved       %d (%.2f%%)" % (saved, 100.0 * saved / args.reactions))
+    print("per 10k reactions  %.1f RPC calls" % (client.calls * 10000.0 / args.reactions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""In-process stand-in for the supabase client used by the benchmarks.
+
+Supports the subset of the postgrest builder API that main.py uses: select,
+insert, update, eq/gt/lt/in_ filters, or_ (with nested and()/or() of eq, gt
+and lt), order, limit, single and rpc, including the place_order_batch
+function. Every
+execute() sleeps for `latency` seconds (plus optional jitter) to model the
+network round trip. Unsupported calls raise instead of silently returning
+wrong data.
+"""
+import itertools
+import operator
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+OPERATORS = {"eq": operator.eq, "gt": operator.gt, "lt": operator.lt}
+
+
+def split_top_level(expression):
+    """Split a PostgREST logic expression on commas that aren't inside parentheses or quotes."""
+    parts, depth, quoted, start = [], 0, False, 0
+    for index, ch in enumerate(expression):
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and ch == "," and depth == 0:
+            parts.append(expression[start:index])
+            start = index + 1
+    parts.append(expression[start:])
+    return parts
+
+
+def parse_condition(condition):
+    """Predicate for one `col.op.value`, `and(...)` or `or(...)` term."""
+    for combinator, combine in (("and(", all), ("or(", any)):
+        if condition.startswith(combinator) and condition.endswith(")"):
+            terms = [parse_condition(part) for part in split_top_level(condition[len(combinator):-1])]
+            return lambda row: combine(term(row) for term in terms)
+    column, op, value = condition.split(".", 2)
+    if op not in OPERATORS:
+        raise NotImplementedError("FakeSupabase does not support the %r operator in or_()" % op)
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+
+    def predicate(row):
+        actual = row.get(column)
+        # Filter values arrive as text; compare them as the column's type.
+        return OPERATORS[op](actual, type(actual)(value) if isinstance(actual, int) else value)
+    return predicate
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.operation = None
+        self.payload = None
+        self.filters = []
+        self.orders = []
+        self.row_limit = None
+        self.columns = None
+        self.is_single = False
+
+    def select(self, columns="*", **kwargs):
+        self.operation = "select"
+        self.columns = None if columns == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.operation = "insert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values, **kwargs):
+        self.operation = "update"
+        self.payload = values
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) > value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) < value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def or_(self, filters, **kwargs):
+        self.filters.append(parse_condition("or(%s)" % filters))
+        return self
+
+    def order(self, column, desc=False, **kwargs):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size, **kwargs):
+        self.row_limit = size
+        return self
+
+    def single(self):
+        self.is_single = True
+        return self
+
+    def execute(self):
+        self.db.sleep()
+        with self.db.lock:
+            return self._run()
+
+    def _run(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.operation == "insert":
+            inserted = []
+            for row in self.payload:
+                row = dict(row, id=next(self.db.ids[self.table]), created_at=self.db.now())
+                rows.append(row)
+                inserted.append(dict(row))
+            return FakeResponse(inserted)
+
+        matched = [row for row in rows if all(f(row) for f in self.filters)]
+        if self.operation == "update":
+            for row in matched:
+                row.update(self.payload)
+            return FakeResponse([dict(row) for row in matched])
+        if self.operation != "select":
+            raise NotImplementedError("FakeSupabase does not support %r" % self.operation)
+
+        for column, desc in reversed(self.orders):
+            matched.sort(key=lambda row: row[column], reverse=desc)
+        if self.row_limit is not None:
+            matched = matched[:self.row_limit]
+        if self.columns is not None:
+            matched = [{c: row.get(c) for c in self.columns} for row in matched]
+        else:
+            matched = [dict(row) for row in matched]
+        if self.is_single:
+            if len(matched) != 1:
+                raise Exception("JSON object requested, multiple (or no) rows returned")
+            return FakeResponse(matched[0])
+        return FakeResponse(matched)
+
+    def __getattr__(self, name):
+        raise AttributeError("FakeSupabase does not support .%s()" % name)
+
+
+class FakeRpc:
+    def __init__(self, db, fn, params):
+        self.db = db
+        self.fn = fn
+        self.params = params
+
+    def execute(self):
+        self.db.sleep()
+        if self.fn == "place_order_batch":
+            with self.db.lock:
+                return FakeResponse(self._place_order_batch())
+        return FakeResponse(None)
+
+    def _place_order_batch(self):
+        # Mirrors the SQL function in services/order_batch.py.
+        products = {row["id"]: row for row in self.db.tables.get("products", [])}
+        results = []
+        for line in self.params["items"]:
+            product = products.get(line["product_id"])
+            if product is None or product["stock"] < line["quantity"]:
+                error = "Unknown product" if product is None else "Insufficient stock"
+                results.append({"index": line["index"], "status": "rejected", "error": error})
+                continue
+            product["stock"] -= line["quantity"]
+            order = self.db.table("orders").insert([{
+                "product_id": line["product_id"],
+                "quantity": line["quantity"],
+                "customer_name": line["customer_name"] or self.params["default_customer"],
+                "status_history": [{"status": "pending"}],
+            }])._run().data[0]
+            results.append({"index": line["index"], "status": "placed", "order": order})
+        return results
+
+
+class FakeSupabase:
+    def __init__(self, latency=0.0, jitter=0.0, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.tables = {}
+        self.ids = {}
+        self.lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._clock = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def sleep(self):
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def now(self):
+        self._clock += timedelta(seconds=1)
+        return self._clock.isoformat()
+
+    def table(self, name):
+        self.ids.setdefault(name, itertools.count(1))
+        return FakeQuery(self, name)
+
+    def rpc(self, fn, params=None, **kwargs):
+        return FakeRpc(self, fn, params)
+
+    def seed_products(self, count):
+        for i in range(count):
+            self.table("products").insert({
+                "name": "Product %d" % i,
+                "price": 10 + i % 50,
+                "stock": 1000000,
+                "image": "https://example.com/%d.png" % i,
+                "description": "Seeded product %d " % i * 8,
+                "created_by": "bench",
+            })._run()
+
+    def seed_orders(self, count, events_per_order):
+        for i in range(count):
+            order = self.table("orders").insert({
+                "product_id": 1,
+                "quantity": 1,
+                "customer_name": "Bench",
+                "status_history": [{"status": "pending"}],
+            })._run().data[0]
+            for status in ["pending", "paid", "packed", "shipped", "delivered"][:events_per_order]:
+                self.table("order_status_events").insert({"order_id": order["id"], "status": status})._run()
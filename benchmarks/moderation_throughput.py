@@ -0,0 +1,72 @@
+"""Moderation throughput against blocklist size.
+
+    python -m benchmarks.moderation_throughput --sizes 100,1000,10000,50000
+
+For each blocklist size, scores --texts synthetic comments with the compiled
+Aho-Corasick matcher and, up to --naive-max terms, with the one-regex-per-term
+approach it replaces. Reports build time and texts per second.
+"""
+import argparse
+import random
+import re
+import string
+import time
+
+from services.recap_moderation import Matcher, normalize
+
+
+def random_word(rng, low=3, high=10):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+
+
+def make_texts(rng, terms, count, words):
+    texts = []
+    for _ in range(count):
+        text = [random_word(rng) for _ in range(words)]
+        if terms and rng.random() < 0.1:
+            text[rng.randrange(words)] = rng.choice(terms)
+        texts.append(" ".join(text))
+    return texts
+
+
+def rate(fn, texts):
+    start = time.perf_counter()
+    for text in texts:
+        fn(text)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000,50000")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=40, help="words per text")
+    parser.add_argument("--naive-max", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("%8s %10s %14s %14s" % ("terms", "build ms", "matcher tx/s", "regex tx/s"))
+    for size in (int(s) for s in args.sizes.split(",")):
+        rng = random.Random(args.seed)
+        terms = sorted({random_word(rng, 4, 12) for _ in range(size)})
+        texts = make_texts(rng, terms, args.texts, args.words)
+
+        start = time.perf_counter()
+        matcher = Matcher((term, 1.0) for term in terms)
+        build_ms = (time.perf_counter() - start) * 1000
+        matcher_rate = rate(lambda text: matcher.score(text, 1.0), texts)
+
+        naive_rate = None
+        if size <= args.naive_max:
+            patterns = [re.compile(r"\b%s\b" % re.escape(term)) for term in terms]
+            def naive(text):
+                text = normalize(text)
+                return [p for p in patterns if p.search(text)]
+            naive_rate = rate(naive, texts)
+
+        print("%8d %10.1f %14.0f %14s" % (
+            len(terms), build_ms, matcher_rate, "%.0f" % naive_rate if naive_rate else "-"))
+
+
+if __name__ == "__main__":
+    main()
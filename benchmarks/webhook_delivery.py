@@ -0,0 +1,105 @@
+"""End-to-end webhook delivery against a local HTTP sink.
+
+    python -m benchmarks.webhook_delivery --events 200
+
+Starts an HTTP sink with three endpoints: /ok always answers 204, /flaky
+fails its first --flaky-failures requests, /down always answers 500. Queues
+--events recap.created events for each endpoint in a temporary queue, runs
+the Dispatcher until everything is delivered or dead, then checks that /ok
+and /flaky received every event, that every /down event ended up dead and
+that requeueing the dead events puts them back in the queue. Prints the
+queue stats; exits non-zero if a check fails or --timeout runs out.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from services.recap_webhooks import Dispatcher, WebhookQueue
+
+
+class Sink(BaseHTTPRequestHandler):
+    received = Counter()
+    flaky_failures = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.lock:
+            fail = self.path == "/down" or (self.path == "/flaky" and Sink.flaky_failures > 0)
+            if self.path == "/flaky" and fail:
+                Sink.flaky_failures -= 1
+            if not fail:
+                for event in body["events"]:
+                    Sink.received[(self.path, event["payload"]["i"])] += 1
+        self.send_response(500 if fail else 204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200, help="events queued per endpoint")
+    parser.add_argument("--flaky-failures", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    Sink.flaky_failures = args.flaky_failures
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Sink)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:%d" % server.server_port
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = WebhookQueue(os.path.join(tmp, "webhooks.sqlite3"))
+        endpoints = [base + "/ok", base + "/flaky", base + "/down"]
+        for i in range(args.events):
+            queue.enqueue("recap.created", {"i": i}, endpoints)
+        dispatcher = Dispatcher(queue, max_attempts=3, backoff_base=0.01, backoff_cap=0.05,
+                                breaker_threshold=2, breaker_cooldown=0.1, poll_interval=0.02)
+        thread = threading.Thread(target=dispatcher.run, daemon=True)
+        thread.start()
+
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            depth = queue.stats()["queue_depth"]
+            if depth["queued"] == 0 and depth["delivering"] == 0:
+                break
+            time.sleep(0.1)
+        dispatcher.stop()
+        thread.join()
+
+        stats = queue.stats()
+        stats["breakers"] = dispatcher.breaker_states()
+        print(json.dumps(stats, indent=1))
+
+        failures = []
+        for path in ("/ok", "/flaky"):
+            missing = [i for i in range(args.events) if not Sink.received[(path, i)]]
+            if missing:
+                failures.append("%s missed %d events" % (path, len(missing)))
+        if any(path == "/down" for path, _ in Sink.received):
+            failures.append("/down received events")
+        if stats["queue_depth"]["dead"] != args.events:
+            failures.append("expected %d dead events, found %d" % (args.events, stats["queue_depth"]["dead"]))
+        requeued = queue.requeue_dead()
+        if requeued != args.events or queue.stats()["queue_depth"]["queued"] != args.events:
+            failures.append("requeue_dead requeued %d of %d events" % (requeued, args.events))
+        duplicates = sum(count - 1 for count in Sink.received.values())
+        print("delivered %d events (%d duplicates), requeued %d dead events" % (
+            sum(Sink.received.values()), duplicates, requeued))
+
+    server.shutdown()
+    if failures:
+        print("FAILED: %s" % "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from flask import Blueprint
 
 recap_api = Blueprint('recap_api', __name__)
-# Placeholder for api/feed.py
+
+# Routes are attached by the modules under api/ (see main.py).
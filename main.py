@@ -1,10 +1,18 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from supabase import create_client, Client
 from flask_cors import CORS
+import logging
 import os
 
+from services import metrics, order_batch, order_events, product_listing
+from services.catalog_cache import catalog_cache
+from services.emoji_tracker import emoji_tracker
+
+log = logging.getLogger(__name__)
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+metrics.instrument_app(app)
 
 # Supabase credentials from environment variables (more secure!)
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -13,7 +21,9 @@ SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise Exception("Missing SUPABASE_URL or SUPABASE_KEY environment variables.")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = metrics.instrument_client(create_client(SUPABASE_URL, SUPABASE_KEY))
+app.extensions["supabase"] = supabase
+emoji_tracker.bind(supabase)
 
 # -------------------- HEALTH CHECK --------------------
 @app.route("/")
@@ -24,10 +34,33 @@ def health():
 @app.route("/api/products", methods=["GET"])
 def get_products():
     try:
-        response = supabase.table("products").select("*").order("created_at", desc=True).execute()
-        return jsonify(response.data), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        query = product_listing.parse_listing_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cache_key = product_listing.cache_key(query)
+    cached = catalog_cache.get(cache_key)
+    if cached is None:
+        version = catalog_cache.version()
+        try:
+            rows = product_listing.listing_query(query).execute(supabase)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        body = product_listing.listing_body(rows, query)
+        etag = catalog_cache.put(cache_key, body, version)
+    else:
+        etag, body = cached
+    return catalog_response(etag, body)
+
+def catalog_response(etag, body):
+    # If-None-Match uses weak comparison (RFC 9110 13.1.2); gzip proxies weaken our ETags.
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, status=200, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 @app.route("/api/product", methods=["POST"])
 def add_product():
@@ -41,6 +74,7 @@ def add_product():
             "description": data.get("description", ""),
             "created_by": data.get("created_by", "admin")
         }).execute()
+        catalog_cache.invalidate()
         return jsonify({"message": "Product added successfully", "product": result.data[0]}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -56,18 +90,99 @@ def place_order():
             "customer_name": data.get("customer_name", "Guest"),
             "status_history": [{"status": "pending"}]
         }).execute()
-        return jsonify({"message": "Order placed", "order": result.data[0]}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    record_initial_status([result.data[0]["id"]])
+    return jsonify({"message": "Order placed", "order": result.data[0]}), 201
+
+def record_initial_status(order_ids):
+    # Best effort: the order itself is already placed, and full status-history
+    # reads fall back to the legacy status_history column. since= pollers won't
+    # see "pending" for these orders, hence the log line.
+    try:
+        order_events.append_events(supabase, [(order_id, "pending") for order_id in order_ids])
+    except Exception:
+        log.exception("Failed to record initial status for orders %s", order_ids)
+
+@app.route("/api/orders/batch", methods=["POST"])
+def place_order_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > order_batch.MAX_BATCH_ITEMS:
+        return jsonify({"error": "At most %d items per batch" % order_batch.MAX_BATCH_ITEMS}), 400
+    try:
+        results, stock_changed = order_batch.place_batch(supabase, items, data.get("customer_name", "Guest"))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if stock_changed:
+        catalog_cache.invalidate()
+    record_initial_status([r["order"]["id"] for r in results if r["status"] == "placed"])
+    placed = sum(1 for r in results if r["status"] == "placed")
+    if placed == len(results):
+        status = 201
+    elif placed:
+        status = 207
+    elif all(r["status"] == "invalid" for r in results):
+        status = 400
+    elif any(r["status"] == "rejected" for r in results):
+        status = 409
+    else:
+        status = 500
+    return jsonify({"placed": placed, "failed": len(results) - placed, "results": results}), status
 
 @app.route("/api/order/<int:order_id>/status-history", methods=["GET"])
 def get_status_history(order_id):
     try:
-        result = supabase.table("orders").select("status_history").eq("id", order_id).single().execute()
-        return jsonify(result.data["status_history"]), 200
+        since = order_events.parse_since(request.args.get("since"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        if since is not None:
+            events = order_events.fetch_events(supabase, [order_id], since)
+            return jsonify(order_events.envelope(events, since)), 200
+        # Without since: the whole history, legacy column first, as a plain list.
+        rows = order_events.legacy_history_query(order_id).execute(supabase)
+        if not rows:
+            return jsonify({"error": "Order not found"}), 404
+        events = order_events.fetch_all_events(supabase, order_id)
+        return jsonify(order_events.merge_legacy(rows[0]["status_history"], events)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/order/<int:order_id>/status", methods=["POST"])
+def add_order_status(order_id):
+    data = request.json or {}
+    status = data.get("status")
+    if not isinstance(status, str) or not status.strip() or len(status) > 64:
+        return jsonify({"error": "status must be a non-empty string of at most 64 characters"}), 400
+    try:
+        event = order_events.append_events(supabase, [(order_id, status.strip())])[0]
+        return jsonify(event), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/orders/status-events", methods=["GET"])
+def get_status_events():
+    try:
+        order_ids = order_events.parse_order_ids(request.args.get("ids"))
+        since = order_events.parse_since(request.args.get("since"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        events = order_events.fetch_events(supabase, order_ids, since)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify(order_events.envelope(events, since)), 200
+
+# -------------------- METRICS --------------------
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 # -------------------- TEST DB --------------------
 @app.route("/test-db")
 def test_db():
@@ -77,6 +192,16 @@ def test_db():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# -------------------- RECAP BLUEPRINT --------------------
+from feed import recap_api
+import api.comments  # noqa: F401 - registers routes on recap_api
+import api.feed  # noqa: F401
+import api.moderation  # noqa: F401
+import api.recap  # noqa: F401
+import api.tasks  # noqa: F401
+
+app.register_blueprint(recap_api)
+
 # -------------------- MAIN --------------------
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+
+import httpx
+
+from services import metrics
+
+# Async PostgREST access for the ASGI entry point (asgi.py).
+#
+# One httpx.AsyncClient per process holds a keep-alive connection pool that all
+# requests share. The client is created on first use, so the server starts even
+# when Supabase is slow or the env isn't set yet; the error surfaces on the
+# request that needs the database instead.
+#
+# POSTGREST_URL points the client at any PostgREST endpoint, e.g. a local
+# `postgrest` container or stand-in server for testing. It defaults to
+# $SUPABASE_URL/rest/v1.
+
+
+class ConfigError(Exception):
+    pass
+
+
+class RouteBusy(Exception):
+    pass
+
+
+class UpstreamTimeout(Exception):
+    pass
+
+
+class AsyncPostgrest:
+    def __init__(self, base_url=None, key=None, pool_size=None, keepalive=None, timeout=None):
+        self._base_url = base_url
+        self._key = key
+        self.pool_size = pool_size or int(os.environ.get("ASYNC_DB_POOL_SIZE", "20"))
+        self.keepalive = keepalive or int(os.environ.get("ASYNC_DB_KEEPALIVE", "10"))
+        self.timeout = timeout or float(os.environ.get("ASYNC_DB_TIMEOUT", "5"))
+        self._client = None
+        self._lock = None
+
+    def _settings(self):
+        base_url = self._base_url or os.environ.get("POSTGREST_URL")
+        key = self._key or os.environ.get("SUPABASE_KEY")
+        if not base_url:
+            supabase_url = os.environ.get("SUPABASE_URL")
+            if not supabase_url:
+                raise ConfigError("Missing POSTGREST_URL or SUPABASE_URL environment variable.")
+            base_url = supabase_url.rstrip("/") + "/rest/v1"
+        headers = {"Accept": "application/json"}
+        if key:
+            headers["apikey"] = key
+            headers["Authorization"] = "Bearer %s" % key
+        return base_url.rstrip("/"), headers
+
+    async def client(self):
+        if self._client is not None:
+            return self._client
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._client is None:
+                base_url, headers = self._settings()
+                self._client = httpx.AsyncClient(
+                    base_url=base_url,
+                    headers=headers,
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.keepalive,
+                    ),
+                )
+        return self._client
+
+    async def select(self, table, params):
+        client = await self.client()
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await client.get("/" + table, params=params)
+            response.raise_for_status()
+            outcome = "ok"
+        except httpx.TimeoutException as e:
+            raise UpstreamTimeout("Database timed out: %s" % (str(e) or type(e).__name__))
+        finally:
+            metrics.supabase_duration.observe(time.perf_counter() - start, table, "select", outcome)
+        return response.json()
+
+    async def run(self, query):
+        """Run a services.postgrest_query.Query and return the rows."""
+        return await self.select(query.table, query.params())
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class RouteLimiter:
+    """Caps in-flight requests per route and bounds how long each may take.
+
+    `ASYNC_ROUTE_LIMITS` is a comma-separated list of route:concurrency pairs,
+    e.g. "products:64,status_history:128". Requests that wait longer than
+    `queue_timeout` for a slot get RouteBusy; handlers that run longer than
+    `timeout` get asyncio.TimeoutError.
+    """
+
+    def __init__(self, default_limit=None, timeout=None, queue_timeout=None):
+        self.default_limit = default_limit or int(os.environ.get("ASYNC_ROUTE_DEFAULT_LIMIT", "32"))
+        self.timeout = timeout or float(os.environ.get("ASYNC_ROUTE_TIMEOUT", "10"))
+        self.queue_timeout = queue_timeout or float(os.environ.get("ASYNC_ROUTE_QUEUE_TIMEOUT", "2"))
+        self.limits = {}
+        for pair in os.environ.get("ASYNC_ROUTE_LIMITS", "").split(","):
+            if ":" in pair:
+                name, limit = pair.split(":", 1)
+                self.limits[name.strip()] = int(limit)
+        self._semaphores = {}
+
+    def _semaphore(self, route):
+        semaphore = self._semaphores.get(route)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limits.get(route, self.default_limit))
+            self._semaphores[route] = semaphore
+        return semaphore
+
+    async def run(self, route, coro):
+        semaphore = self._semaphore(route)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            coro.close()
+            raise RouteBusy("Too many concurrent requests for %s" % route)
+        try:
+            return await asyncio.wait_for(coro, self.timeout)
+        finally:
+            semaphore.release()
+
+
+postgrest = AsyncPostgrest()
+limiter = RouteLimiter()
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from services.sqlite_local import LocalDatabase
+
+# Versioned cache for serialized product listings.
+#
+# Every entry is tagged with the catalog version it was built from. Writes to
+# the catalog bump the version, which makes every older entry unreachable at
+# once. Entries also expire after a TTL and the cache holds at most
+# `max_entries` listings (oldest evicted first).
+#
+# Two backends:
+#   memory - per-process OrderedDict. Fastest, but an invalidation in one
+#            gunicorn worker only reaches the others once their TTL runs out.
+#   sqlite - a small SQLite file shared by every worker on the host, so an
+#            invalidation is seen by all workers on their next read.
+
+
+def make_etag(body):
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+class MemoryBackend:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            version, expires, etag, body = entry
+            if version != self._version or expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return etag, body
+
+    def version(self):
+        return self._version
+
+    def put(self, key, etag, body, version):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+
+class SqliteBackend:
+    def __init__(self, ttl, max_entries, path):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.db = LocalDatabase(self.path)
+        conn = self.db.conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS catalog_meta (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO catalog_meta (id, version) VALUES (1, 0)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS catalog_entries ("
+                "key TEXT PRIMARY KEY, version INTEGER NOT NULL, expires REAL NOT NULL, "
+                "stored REAL NOT NULL, etag TEXT NOT NULL, body BLOB NOT NULL)"
+            )
+
+    def get(self, key):
+        row = self.db.conn().execute(
+            "SELECT e.etag, e.body FROM catalog_entries e JOIN catalog_meta m ON m.id = 1 "
+            "WHERE e.key = ? AND e.version = m.version AND e.expires > ?",
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], bytes(row[1])
+
+    def version(self):
+        return self.db.conn().execute("SELECT version FROM catalog_meta WHERE id = 1").fetchone()[0]
+
+    def put(self, key, etag, body, version):
+        now = time.time()
+        conn = self.db.conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO catalog_entries (key, version, expires, stored, etag, body) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, version, now + self.ttl, now, etag, body),
+            )
+            conn.execute(
+                "DELETE FROM catalog_entries WHERE key IN ("
+                "SELECT key FROM catalog_entries ORDER BY stored DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def invalidate(self):
+        conn = self.db.conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE catalog_meta SET version = version + 1 WHERE id = 1")
+            conn.execute("DELETE FROM catalog_entries")
+
+
+class CatalogCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, key):
+        """Return (etag, body) for a cached listing, or None on a miss."""
+        try:
+            return self.backend.get(key)
+        except sqlite3.Error:
+            return None
+
+    def version(self):
+        """Current catalog version; read it *before* querying the database."""
+        try:
+            return self.backend.version()
+        except sqlite3.Error:
+            return None
+
+    def put(self, key, body, version):
+        """Store a serialized listing built at `version` and return its (unquoted) strong ETag.
+
+        A listing fetched while a write was invalidating the catalog carries the
+        old version, so it is never served.
+        """
+        etag = make_etag(body)
+        if version is None:
+            return etag
+        try:
+            self.backend.put(key, etag, body, version)
+        except sqlite3.Error:
+            pass
+        return etag
+
+    def invalidate(self):
+        try:
+            self.backend.invalidate()
+        except sqlite3.Error:
+            pass
+
+
+def cache_from_env():
+    ttl = float(os.environ.get("CATALOG_CACHE_TTL", "30"))
+    max_entries = int(os.environ.get("CATALOG_CACHE_MAX_ENTRIES", "256"))
+    backend = os.environ.get("CATALOG_CACHE_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        path = os.environ.get("CATALOG_CACHE_PATH", "/tmp/cultivai_catalog_cache.sqlite3")
+        return CatalogCache(SqliteBackend(ttl, max_entries, path))
+    if backend != "memory":
+        raise Exception("Unknown CATALOG_CACHE_BACKEND: %s" % backend)
+    return CatalogCache(MemoryBackend(ttl, max_entries))
+
+
+catalog_cache = cache_from_env()
@@ -1 +1,199 @@
-# Placeholder for services/emoji_tracker.py
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Write-behind aggregation for emoji reactions.
+#
+# A tap only bumps an in-memory counter keyed by (recap_id, emoji). A
+# background thread flushes the accumulated deltas to Supabase in one RPC call
+# when `max_pending` distinct keys are waiting or every `flush_interval`
+# seconds, whichever comes first, and once more when the worker exits.
+#
+# The RPC adds the deltas in a single upsert:
+#
+#   create function increment_recap_reactions(deltas jsonb) returns void
+#   language sql as $$
+#     insert into recap_reaction_counts (recap_id, emoji, count)
+#     select (d->>'recap_id')::bigint, d->>'emoji', (d->>'delta')::bigint
+#     from jsonb_array_elements(deltas) d
+#     on conflict (recap_id, emoji)
+#     do update set count = recap_reaction_counts.count + excluded.count;
+#   $$;
+#
+# A failed flush puts its deltas back and the flusher backs off, doubling the
+# wait up to EMOJI_FLUSH_MAX_BACKOFF seconds; a full buffer doesn't cut the
+# wait short while the database is failing. When the database rejects the
+# deltas themselves (SQLSTATE class 22/23, e.g. a recap that no longer
+# exists), the batch is split in halves until the bad deltas are isolated;
+# those are dropped and logged, the rest are written.
+#
+# Reads add this worker's unflushed deltas to the persisted counts, so a
+# client sees its own reactions immediately. Deltas held by other workers show
+# up after their next flush.
+
+COUNTS_TABLE = "recap_reaction_counts"
+INCREMENT_RPC = "increment_recap_reactions"
+
+log = logging.getLogger(__name__)
+
+
+def is_data_error(error):
+    """True when the database rejected the deltas themselves rather than failing."""
+    code = getattr(error, "code", None)
+    return isinstance(code, str) and code[:2] in ("22", "23")
+
+
+class EmojiTracker:
+    def __init__(self, client=None, max_pending=None, flush_interval=None):
+        self.client = client
+        self.max_pending = max_pending or int(os.environ.get("EMOJI_FLUSH_MAX_PENDING", "500"))
+        self.flush_interval = flush_interval or float(os.environ.get("EMOJI_FLUSH_INTERVAL", "2"))
+        self.max_backoff = float(os.environ.get("EMOJI_FLUSH_MAX_BACKOFF", "60"))
+        self.max_known_recaps = int(os.environ.get("EMOJI_KNOWN_RECAPS", "10000"))
+        self._delay = self.flush_interval
+        self._retry_at = 0
+        self._known_recaps = OrderedDict()
+        self._pending = Counter()
+        self._in_flight = Counter()
+        self._flushes_started = 0
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = Counter()
+
+    def bind(self, client):
+        self.client = client
+
+    def _ensure_thread(self):
+        # Started on first use so gunicorn's master never owns the thread.
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="emoji-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self._delay)
+            self._wake.clear()
+            try:
+                self.flush()
+                self._delay = self.flush_interval
+            except Exception:
+                self._delay = min(self._delay * 2, self.max_backoff)
+                log.exception("Flushing emoji reactions failed, retrying in %.1fs", self._delay)
+            self._retry_at = time.monotonic() + self._delay if self._delay > self.flush_interval else 0
+
+    def react(self, recap_id, emoji, delta=1):
+        with self._lock:
+            self._pending[(recap_id, emoji)] += delta
+            self.stats["reactions"] += 1
+            full = len(self._pending) >= self.max_pending
+            if self._thread is None:
+                self._ensure_thread()
+        if full and time.monotonic() >= self._retry_at:
+            self._wake.set()
+
+    def recap_exists(self, recap_id):
+        """Whether the recap exists; hits are remembered so hot recaps cost no reads."""
+        with self._lock:
+            if recap_id in self._known_recaps:
+                self._known_recaps.move_to_end(recap_id)
+                return True
+        rows = self.client.table("recaps").select("id").eq("id", recap_id).limit(1).execute().data
+        if not rows:
+            return False
+        with self._lock:
+            self._known_recaps[recap_id] = True
+            while len(self._known_recaps) > self.max_known_recaps:
+                self._known_recaps.popitem(last=False)
+        return True
+
+    def flush(self):
+        """Write all pending deltas in one RPC call. Deltas that couldn't be written go back to pending."""
+        with self._lock:
+            while self._in_flight:
+                self._flushed.wait()
+            if not self._pending:
+                return 0
+            self._in_flight, self._pending = self._pending, Counter()
+            self._flushes_started += 1
+            batch = self._in_flight
+        items = [(key, delta) for key, delta in batch.items() if delta]
+        written, unsent, error = self._write(items)
+        with self._lock:
+            for key, delta in unsent:
+                self._pending[key] += delta
+            self._in_flight = Counter()
+            self.stats["rows_written"] += written
+            self.stats["failed_flushes" if error else "flushes"] += 1
+            self._flushed.notify_all()
+        if error is not None:
+            raise error
+        return written
+
+    def _send(self, items):
+        deltas = [{"recap_id": recap_id, "emoji": emoji, "delta": delta} for (recap_id, emoji), delta in items]
+        self.client.rpc(INCREMENT_RPC, {"deltas": deltas}).execute()
+
+    def _write(self, items):
+        """Returns (rows written, items to retry, error to report)."""
+        if not items:
+            return 0, [], None
+        try:
+            self._send(items)
+            return len(items), [], None
+        except Exception as e:
+            if not is_data_error(e):
+                return 0, items, e
+            if len(items) == 1:
+                (recap_id, emoji), delta = items[0]
+                log.error("Dropping emoji delta %+d for recap %s %s: %s", delta, recap_id, emoji, e)
+                with self._lock:
+                    self.stats["dropped_deltas"] += 1
+                return 0, [], None
+        half = len(items) // 2
+        written, unsent, error = self._write(items[:half])
+        if error is not None:
+            return written, unsent + items[half:], error
+        second = self._write(items[half:])
+        return written + second[0], unsent + second[1], second[2]
+    def _unflushed(self, recap_id):
+        counts = Counter()
+        for (key_recap, emoji), delta in self._pending.items():
+            if key_recap == recap_id:
+                counts[emoji] += delta
+        return counts
+
+    def counts(self, recap_id, retries=3):
+        """Persisted counts for a recap plus this worker's unflushed deltas."""
+        for _ in range(retries):
+            with self._lock:
+                while self._in_flight:
+                    self._flushed.wait()
+                started = self._flushes_started
+                pending = self._unflushed(recap_id)
+            rows = self.client.table(COUNTS_TABLE).select("emoji,count").eq("recap_id", recap_id).execute().data
+            with self._lock:
+                if self._flushes_started == started:
+                    break
+            # A flush ran while we were reading, so the pending snapshot may
+            # already be in `rows`; take both again.
+        counts = Counter({row["emoji"]: row["count"] for row in rows})
+        counts.update(pending)
+        return {emoji: count for emoji, count in counts.items() if count}
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception:
+            log.exception("Final emoji reaction flush failed, %d deltas lost", len(self._pending))
+
+
+emoji_tracker = EmojiTracker()
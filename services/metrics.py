@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Request and Supabase instrumentation, exported in Prometheus text format.
+#
+#   http_request_duration_seconds{route,method,status}     per-route latency
+#   http_request_size_bytes / http_response_size_bytes     payload sizes
+#   supabase_call_duration_seconds{table,operation,outcome} one sample per
+#                                                            executed query
+#
+# The registry is per process: under gunicorn each worker exports its own
+# numbers, so scrape every worker (or sum them with `sum without (instance)`).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+QUERY_OPERATIONS = ("select", "insert", "update", "upsert", "delete")
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s histogram" % self.name]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, (counts, total, count) in series:
+            labels = ",".join('%s="%s"' % (k, escape(v)) for k, v in zip(self.labels, label_values))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append('%s_bucket{%sle="%s"} %d' % (self.name, prefix, le, cumulative))
+            lines.append("%s_sum{%s} %r" % (self.name, labels, total))
+            lines.append("%s_count{%s} %d" % (self.name, labels, count))
+        return "\n".join(lines)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request.",
+    ("route", "method", "status"), LATENCY_BUCKETS)
+request_size = Histogram(
+    "http_request_size_bytes", "Request body size.", ("route", "method"), SIZE_BUCKETS)
+response_size = Histogram(
+    "http_response_size_bytes", "Response body size.", ("route", "method"), SIZE_BUCKETS)
+supabase_duration = Histogram(
+    "supabase_call_duration_seconds", "Time spent in one Supabase/PostgREST call.",
+    ("table", "operation", "outcome"), LATENCY_BUCKETS)
+
+REGISTRY = (request_duration, request_size, response_size, supabase_duration)
+
+
+def render():
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def observe_request(route, method, status, seconds, request_bytes=None, response_bytes=None):
+    request_duration.observe(seconds, route, method, str(status))
+    if request_bytes is not None:
+        request_size.observe(request_bytes, route, method)
+    if response_bytes is not None:
+        response_size.observe(response_bytes, route, method)
+
+
+# -------------------- FLASK MIDDLEWARE --------------------
+def instrument_app(app):
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            response_bytes = None if response.is_streamed else response.calculate_content_length()
+            observe_request(route, request.method, response.status_code, time.perf_counter() - start,
+                            request.content_length or 0, response_bytes)
+        return response
+
+
+# -------------------- SUPABASE CLIENT --------------------
+class InstrumentedQuery:
+    """Wraps a postgrest request builder and times its execute()."""
+
+    def __init__(self, builder, table, operation):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            # e.g. the `not_` property, which returns another builder
+            if hasattr(attr, "execute"):
+                return InstrumentedQuery(attr, self._table, self._operation)
+            return attr
+        if name == "execute":
+            return self._execute
+        operation = self._operation
+        if operation is None and name in QUERY_OPERATIONS:
+            operation = name
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return InstrumentedQuery(result, self._table, operation)
+            return result
+        return call
+
+    def _execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = self._builder.execute(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            supabase_duration.observe(time.perf_counter() - start, self._table, self._operation or "unknown", outcome)
+
+
+class InstrumentedClient:
+    """Drop-in wrapper for a supabase Client that records every table/rpc call."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name):
+        return InstrumentedQuery(self._client.table(name), name, None)
+
+    def rpc(self, fn, params=None, *args, **kwargs):
+        return InstrumentedQuery(self._client.rpc(fn, params, *args, **kwargs), fn, "rpc")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument_client(client):
+    if os.environ.get("METRICS_DISABLED", "0").lower() in ("1", "true", "yes"):
+        return client
+    return InstrumentedClient(client)
@@ -0,0 +1,95 @@
+import os
+
+# Batch order placement.
+#
+# Reserving stock and inserting the orders happen in one Postgres function, so
+# a batch is a single round trip and a single transaction: either the stock is
+# decremented and the orders exist, or neither happened. It locks the batch's
+# product rows in id order (concurrent batches can't deadlock), then grants
+# line items in request order; an item that no longer fits is rejected on its
+# own without failing the rest of the batch, and stock never goes negative.
+#
+#   create function place_order_batch(items jsonb, default_customer text) returns jsonb
+#   language plpgsql as $$
+#   declare
+#     item record;
+#     placed orders;
+#     results jsonb := '[]';
+#   begin
+#     perform 1 from products
+#      where id in (select (i->>'product_id')::bigint from jsonb_array_elements(items) i)
+#      order by id for update;
+#     for item in select value as v from jsonb_array_elements(items) loop
+#       update products set stock = stock - (item.v->>'quantity')::int
+#        where id = (item.v->>'product_id')::bigint and stock >= (item.v->>'quantity')::int;
+#       if found then
+#         insert into orders (product_id, quantity, customer_name, status_history)
+#         values ((item.v->>'product_id')::bigint, (item.v->>'quantity')::int,
+#                 coalesce(item.v->>'customer_name', default_customer), '[{"status": "pending"}]')
+#         returning * into placed;
+#         results := results || jsonb_build_object(
+#           'index', (item.v->>'index')::int, 'status', 'placed', 'order', to_jsonb(placed));
+#       else
+#         results := results || jsonb_build_object(
+#           'index', (item.v->>'index')::int, 'status', 'rejected',
+#           'error', case when exists (select 1 from products where id = (item.v->>'product_id')::bigint)
+#                         then 'Insufficient stock' else 'Unknown product' end);
+#       end if;
+#     end loop;
+#     return results;
+#   end;
+#   $$;
+
+MAX_BATCH_ITEMS = int(os.environ.get("ORDER_BATCH_MAX_ITEMS", "500"))
+PLACE_BATCH_RPC = "place_order_batch"
+
+
+def validate_items(items):
+    """Return (valid, results). `valid` holds (index, item) pairs, `results` has an "invalid" entry for each bad item."""
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {"index": index, "status": "invalid", "error": "Item must be an object"}
+            continue
+        product_id = item.get("product_id")
+        quantity = item.get("quantity")
+        customer_name = item.get("customer_name")
+        if not isinstance(product_id, int) or isinstance(product_id, bool):
+            results[index] = {"index": index, "status": "invalid", "error": "product_id must be an integer"}
+        elif not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            results[index] = {"index": index, "status": "invalid", "error": "quantity must be a positive integer"}
+        elif customer_name is not None and not isinstance(customer_name, str):
+            results[index] = {"index": index, "status": "invalid", "error": "customer_name must be a string"}
+        else:
+            valid.append((index, item))
+    return valid, results
+
+
+def place_batch(client, items, customer_name="Guest"):
+    """Validate a batch of line items and place the valid ones in one transaction.
+
+    Returns (results, stock_changed): the per-item results in request order and
+    whether any product's stock was touched.
+    """
+    valid, results = validate_items(items)
+    if not valid:
+        return results, False
+
+    lines = [{
+        "index": index,
+        "product_id": item["product_id"],
+        "quantity": item["quantity"],
+        "customer_name": item.get("customer_name"),
+    } for index, item in valid]
+    try:
+        placed = client.rpc(PLACE_BATCH_RPC, {"items": lines, "default_customer": customer_name}).execute().data
+    except Exception as e:
+        # The function runs in one transaction, so nothing was reserved.
+        for index, _ in valid:
+            results[index] = {"index": index, "status": "failed", "error": str(e)}
+        return results, False
+
+    for result in placed:
+        results[result["index"]] = result
+    return results, any(result["status"] == "placed" for result in placed)
@@ -0,0 +1,131 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from services.postgrest_query import Query
+
+# Append-only order status log.
+#
+# Every status change is one row in `order_status_events`:
+#     id          bigint generated always as identity  -- the sequence number
+#     order_id    bigint references orders(id)
+#     status      text
+#     created_at  timestamptz default now()
+# Rows are never updated, so `id` only grows and a poller that remembers the
+# last sequence it saw can ask for just the events after it.
+#
+# Identity values are handed out at insert time, not commit time: id 10 can
+# become visible after id 11, and a poller that already moved past 11 would
+# never see it. Incremental reads therefore stop at the first event younger
+# than COMMIT_LAG seconds (see `settled`). Any insert that started earlier has
+# committed by then, as long as COMMIT_LAG is at least twice the longest
+# insert transaction plus the clock skew between this host and the database.
+# Pollers see new events up to COMMIT_LAG late in exchange.
+
+EVENTS_TABLE = "order_status_events"
+EVENT_COLUMNS = "id,order_id,status,created_at"
+MAX_EVENTS_PER_READ = int(os.environ.get("ORDER_EVENTS_MAX_READ", "1000"))
+MAX_ORDER_IDS = int(os.environ.get("ORDER_EVENTS_MAX_IDS", "500"))
+COMMIT_LAG = float(os.environ.get("ORDER_EVENTS_COMMIT_LAG", "5"))
+
+
+def to_wire(row):
+    return {"seq": row["id"], "order_id": row["order_id"], "status": row["status"], "created_at": row["created_at"]}
+
+
+def append_events(client, events):
+    """Append (order_id, status) pairs in a single insert and return them as wire events."""
+    if not events:
+        return []
+    rows = [{"order_id": order_id, "status": status} for order_id, status in events]
+    result = client.table(EVENTS_TABLE).insert(rows).execute()
+    return [to_wire(row) for row in result.data]
+
+
+def events_query(order_ids, since=None, limit=MAX_EVENTS_PER_READ):
+    """Events for `order_ids` with seq > `since`, oldest first, at most `limit` of them."""
+    query = Query(EVENTS_TABLE, EVENT_COLUMNS)
+    if len(order_ids) == 1:
+        query.where("order_id", "eq", order_ids[0])
+    else:
+        query.where("order_id", "in", order_ids)
+    if since is not None:
+        query.where("id", "gt", since)
+    return query.order("id").limit(limit)
+
+
+def legacy_history_query(order_id):
+    return Query("orders", "status_history").where("id", "eq", order_id)
+
+
+def fetch_events(client, order_ids, since=None, limit=MAX_EVENTS_PER_READ):
+    return [to_wire(row) for row in events_query(order_ids, since, limit).execute(client)]
+
+
+def fetch_all_events(client, order_id):
+    """Every event for one order, following seq across MAX_EVENTS_PER_READ-sized pages."""
+    events, since = [], None
+    while True:
+        page = fetch_events(client, [order_id], since)
+        events.extend(page)
+        if len(page) < MAX_EVENTS_PER_READ:
+            return events
+        since = page[-1]["seq"]
+
+
+def merge_legacy(legacy, events):
+    """Full history: the legacy status_history column followed by the event log.
+
+    Orders placed since the log exists write their initial status to both, so
+    the part of the column the log already starts with is dropped.
+    """
+    legacy = legacy or []
+    overlap = 0
+    while overlap < min(len(legacy), len(events)) and legacy[overlap].get("status") == events[overlap]["status"]:
+        overlap += 1
+    return legacy[overlap:] + events
+
+
+def settled(events, now=None):
+    """The leading events (in seq order) old enough that no lower seq can still commit."""
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(seconds=COMMIT_LAG)
+    for index, event in enumerate(events):
+        created_at = datetime.fromisoformat(event["created_at"])
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        if created_at >= cutoff:
+            return events[:index]
+    return events
+
+
+def envelope(events, since):
+    """Response body for incremental reads; poll again with since=last_seq."""
+    events = settled(events)
+    return {
+        "events": events,
+        "last_seq": events[-1]["seq"] if events else since,
+        "has_more": len(events) >= MAX_EVENTS_PER_READ
+    }
+
+
+def parse_since(value):
+    if value is None or value == "":
+        return None
+    try:
+        since = int(value)
+    except ValueError:
+        raise ValueError("since must be an integer")
+    if since < 0:
+        raise ValueError("since must not be negative")
+    return since
+
+
+def parse_order_ids(value):
+    try:
+        order_ids = sorted({int(v) for v in (value or "").split(",") if v.strip()})
+    except ValueError:
+        raise ValueError("ids must be a comma-separated list of integers")
+    if not order_ids:
+        raise ValueError("ids is required")
+    if len(order_ids) > MAX_ORDER_IDS:
+        raise ValueError("At most %d ids per request" % MAX_ORDER_IDS)
+    return order_ids
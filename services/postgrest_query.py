@@ -0,0 +1,68 @@
+# One read query, described once and run by either entry point.
+#
+# main.py runs it through the supabase-py builder (`execute`), asgi.py sends
+# it as PostgREST query parameters (`params`) through the async client. Both
+# paths produce the same request, so the two servers cannot drift apart.
+
+OPERATORS = ("eq", "gt", "lt", "in")
+
+
+class Query:
+    def __init__(self, table, select="*"):
+        self.table = table
+        self.select = select
+        self.filters = []
+        self.or_filter = None
+        self.orders = []
+        self.row_limit = None
+
+    def where(self, column, operator, value):
+        if operator not in OPERATORS:
+            raise ValueError("Unsupported operator: %s" % operator)
+        self.filters.append((column, operator, value))
+        return self
+
+    def any_of(self, expression):
+        """PostgREST `or` expression, without the surrounding parentheses."""
+        self.or_filter = expression
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self.row_limit = size
+        return self
+
+    def execute(self, client):
+        """Run through a supabase-py client and return the rows."""
+        builder = client.table(self.table).select(self.select)
+        for column, operator, value in self.filters:
+            if operator == "in":
+                builder = builder.in_(column, list(value))
+            else:
+                builder = getattr(builder, operator)(column, value)
+        if self.or_filter is not None:
+            builder = builder.or_(self.or_filter)
+        for column, desc in self.orders:
+            builder = builder.order(column, desc=desc)
+        if self.row_limit is not None:
+            builder = builder.limit(self.row_limit)
+        return builder.execute().data
+
+    def params(self):
+        """The same query as PostgREST URL parameters."""
+        params = [("select", self.select)]
+        for column, operator, value in self.filters:
+            if operator == "in":
+                params.append((column, "in.(%s)" % ",".join(str(v) for v in value)))
+            else:
+                params.append((column, "%s.%s" % (operator, value)))
+        if self.or_filter is not None:
+            params.append(("or", "(%s)" % self.or_filter))
+        if self.orders:
+            params.append(("order", ",".join("%s.%s" % (c, "desc" if d else "asc") for c, d in self.orders)))
+        if self.row_limit is not None:
+            params.append(("limit", str(self.row_limit)))
+        return params
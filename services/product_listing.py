@@ -0,0 +1,144 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+from services.postgrest_query import Query
+
+# Query parsing for GET /api/products.
+#
+# Pages are keyed on (created_at, id), newest first, so a page costs the same
+# no matter how deep the client has scrolled and rows inserted meanwhile never
+# shift the next page. The cursor is an opaque token wrapping the key of the
+# last row returned.
+
+PRODUCT_COLUMNS = ("id", "name", "price", "stock", "image", "description", "created_by", "created_at")
+SUMMARY_COLUMNS = ("id", "name", "price", "stock", "created_at")
+KEY_COLUMNS = ("created_at", "id")
+
+DEFAULT_LIMIT = int(os.environ.get("PRODUCTS_DEFAULT_LIMIT", "20"))
+MAX_LIMIT = int(os.environ.get("PRODUCTS_MAX_LIMIT", "100"))
+
+# While clients migrate, a request without any paging parameter keeps getting
+# the full array. Set PRODUCTS_DEFAULT_PAGINATED=1 to page those too.
+DEFAULT_PAGINATED = os.environ.get("PRODUCTS_DEFAULT_PAGINATED", "0").lower() in ("1", "true", "yes")
+
+TRUE_VALUES = ("1", "true", "yes")
+
+
+def encode_cursor(row):
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError("Invalid cursor")
+    try:
+        parsed = datetime.fromisoformat(created_at)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    # Rebuilt from the parsed value so nothing but a timestamp reaches the PostgREST filter.
+    return parsed.isoformat(), row_id
+
+
+def parse_listing_args(args):
+    """Turn request args into a listing query dict, raising ValueError on bad input."""
+    view = args.get("view", "full")
+    if view not in ("full", "summary"):
+        raise ValueError("view must be 'full' or 'summary'")
+
+    fields = args.get("fields")
+    if fields:
+        columns = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [c for c in columns if c not in PRODUCT_COLUMNS]
+        if unknown:
+            raise ValueError("Unknown fields: %s" % ", ".join(unknown))
+    elif view == "summary":
+        columns = list(SUMMARY_COLUMNS)
+    else:
+        columns = None
+
+    paging_requested = "limit" in args or "cursor" in args
+    if args.get("all", "").lower() in TRUE_VALUES:
+        if paging_requested:
+            raise ValueError("all cannot be combined with limit or cursor")
+        paginate = False
+    else:
+        paginate = paging_requested or DEFAULT_PAGINATED
+
+    try:
+        limit = int(args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1 or limit > MAX_LIMIT:
+        raise ValueError("limit must be between 1 and %d" % MAX_LIMIT)
+
+    cursor = decode_cursor(args["cursor"]) if args.get("cursor") else None
+
+    return {
+        "columns": columns,
+        "paginate": paginate,
+        "limit": limit,
+        "cursor": cursor,
+    }
+
+
+def select_clause(query):
+    columns = query["columns"]
+    if columns is None:
+        return "*"
+    if query["paginate"]:
+        # The cursor needs the key columns even if the client didn't ask for them.
+        columns = columns + [c for c in KEY_COLUMNS if c not in columns]
+    return ",".join(columns)
+
+
+def keyset_filter(cursor):
+    """PostgREST `or` filter selecting rows strictly after the cursor (newest first)."""
+    created_at, row_id = cursor
+    return 'created_at.lt."{0}",and(created_at.eq."{0}",id.lt.{1})'.format(created_at, row_id)
+
+
+def listing_query(query):
+    """The database read for a parsed listing query (see parse_listing_args)."""
+    db_query = Query("products", select_clause(query))
+    if query["paginate"]:
+        if query["cursor"]:
+            db_query.any_of(keyset_filter(query["cursor"]))
+        # One extra row tells build_page whether there is a next page.
+        db_query.order("created_at", desc=True).order("id", desc=True).limit(query["limit"] + 1)
+    else:
+        db_query.order("created_at", desc=True)
+    return db_query
+
+
+def listing_body(rows, query):
+    data = build_page(rows, query) if query["paginate"] else rows
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def cache_key(query):
+    columns = ",".join(query["columns"]) if query["columns"] else "*"
+    if not query["paginate"]:
+        return "products:all:%s" % columns
+    cursor = encode_cursor({"created_at": query["cursor"][0], "id": query["cursor"][1]}) if query["cursor"] else ""
+    return "products:page:%s:%d:%s" % (columns, query["limit"], cursor)
+
+
+def build_page(rows, query):
+    """Trim the over-fetched row, compute next_cursor and drop key columns the client didn't ask for."""
+    has_more = len(rows) > query["limit"]
+    rows = rows[:query["limit"]]
+    next_cursor = encode_cursor(rows[-1]) if has_more and rows else None
+    columns = query["columns"]
+    if columns is not None:
+        extra = [c for c in KEY_COLUMNS if c not in columns]
+        if extra:
+            rows = [{k: v for k, v in row.items() if k not in extra} for row in rows]
+    return {"items": rows, "next_cursor": next_cursor, "limit": query["limit"]}
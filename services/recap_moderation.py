@@ -1 +1,204 @@
-# Placeholder for services/recap_moderation.py
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+
+# Blocklist matching for recaps and comments.
+#
+# The term list is compiled once into an Aho-Corasick automaton, so scanning a
+# text costs one pass over its characters no matter how many terms there are.
+# Texts and terms go through the same normalization first: Unicode
+# compatibility folding, accents stripped, case folded, common leet
+# substitutions undone (0->o, 3->e, @->a, ...) in words that contain a letter
+# and everything that isn't a letter or digit turned into a single space. Terms only match on whole words.
+#
+# Terms live in a text file (MODERATION_TERMS_PATH), one per line, optionally
+# followed by "|<weight>"; lines starting with "#" are comments. Every worker
+# checks the file's mtime at most every MODERATION_RELOAD_INTERVAL seconds and
+# swaps in a freshly compiled matcher when it changed, so edits take effect
+# without a restart. Lines that don't parse are skipped and logged; a file
+# that is missing or can't be read leaves the previous matcher in place.
+
+LEET = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s", "+": "t",
+})
+# "!" and "|" only stand for "i" inside a word ("sh!t"), not as punctuation.
+BANG_I = re.compile(r"[!|](?=\w)")
+# Words for leet purposes: runs of letters, digits and the symbols in LEET.
+LEET_CHAR = re.compile(r"[0134578@$+]")
+WORD = re.compile(r"(?:[^\W_]|[@$+])+")
+
+log = logging.getLogger(__name__)
+
+
+def unleet(match):
+    word = match.group()
+    # Digits only stand for letters inside words ("4ss"), not in numbers ("455").
+    return word.translate(LEET) if any(ch.isalpha() for ch in word) else word
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = BANG_I.sub("i", text.casefold())
+    if LEET_CHAR.search(text):
+        text = WORD.sub(unleet, text)
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in text).split())
+
+
+class Matcher:
+    """Aho-Corasick automaton over normalized terms."""
+
+    def __init__(self, terms):
+        # terms: iterable of (term, weight)
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        self.terms = []
+        seen = set()
+        for term, weight in terms:
+            term = normalize(term)
+            if not term or term in seen:
+                continue
+            seen.add(term)
+            self._add(term, len(self.terms))
+            self.terms.append((term, weight))
+        self._link()
+
+    def _add(self, term, index):
+        state = 0
+        for ch in term:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            state = nxt
+        self.out[state] = self.out[state] + (index,)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find(self, text):
+        """Indices of the terms found as whole words in an already normalized text."""
+        goto, fail, out, terms = self.goto, self.fail, self.out, self.terms
+        found = set()
+        state = 0
+        last = len(text) - 1
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state] and (i == last or text[i + 1] == " "):
+                for index in out[state]:
+                    start = i - len(terms[index][0]) + 1
+                    if start == 0 or text[start - 1] == " ":
+                        found.add(index)
+        return found
+
+    def score(self, text, threshold):
+        found = self.find(normalize(text))
+        score = sum(self.terms[index][1] for index in found)
+        return {
+            "flagged": score >= threshold,
+            "score": score,
+            "matches": sorted(self.terms[index][0] for index in found),
+        }
+
+
+def parse_terms(lines):
+    """Return (terms, skipped): (term, weight) pairs and a message per line that didn't parse."""
+    terms, skipped = [], []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        term, _, weight = line.partition("|")
+        try:
+            weight = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            skipped.append("line %d: weight %r is not a number" % (number, weight.strip()))
+            continue
+        if not math.isfinite(weight):
+            skipped.append("line %d: weight %r is not finite" % (number, weight))
+            continue
+        terms.append((term.strip(), weight))
+    return terms, skipped
+
+
+class Moderator:
+    def __init__(self, path=None, threshold=None, reload_interval=None):
+        self.path = path or os.environ.get("MODERATION_TERMS_PATH", "moderation_terms.txt")
+        self.threshold = threshold or float(os.environ.get("MODERATION_THRESHOLD", "1"))
+        self.reload_interval = reload_interval or float(os.environ.get("MODERATION_RELOAD_INTERVAL", "10"))
+        self._matcher = Matcher(())
+        self._mtime = None
+        self._checked_at = 0
+        self.skipped = []
+        self._last_error = None
+        self._lock = threading.Lock()
+        try:
+            os.stat(self.path)
+        except OSError as e:
+            log.warning("Moderation terms file %s is unavailable (%s), nothing will be flagged until it is", self.path, e)
+            self._last_error = str(e)
+
+    def matcher(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            self._checked_at = now
+            try:
+                self.reload(force=False)
+                self._last_error = None
+            except Exception as e:
+                # A missing file is retried every interval; log it once, not every time.
+                if str(e) != self._last_error:
+                    self._last_error = str(e)
+                    log.exception("Failed to reload moderation terms from %s, keeping the previous list", self.path)
+        return self._matcher
+
+    def reload(self, force=True):
+        """Recompile the term file if it changed (or always, with force). Returns the term count.
+
+        Errors propagate and the previous matcher stays in use. A file that
+        exists but can't be read isn't retried until its mtime changes again.
+        Unparseable lines end up in `skipped`.
+        """
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            if force or mtime != self._mtime:
+                self._mtime = mtime
+                with open(self.path, encoding="utf-8") as f:
+                    terms, skipped = parse_terms(f)
+                for message in skipped:
+                    log.warning("Skipped moderation term in %s, %s", self.path, message)
+                # Readers keep using the old matcher until this assignment.
+                self._matcher = Matcher(terms)
+                self.skipped = skipped
+            return len(self._matcher.terms)
+
+    def score(self, text):
+        return self.matcher().score(text, self.threshold)
+
+    def score_many(self, texts):
+        matcher = self.matcher()
+        return [matcher.score(text, self.threshold) for text in texts]
+
+
+moderator = Moderator()
@@ -0,0 +1,236 @@
+import heapq
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from services.sqlite_local import LocalDatabase
+
+# Precomputed recap timelines.
+#
+# Each user's feed is a capped, sorted array('q') of recap ids (8 bytes per
+# entry); once it holds `capacity` ids, every new id pushes out the oldest.
+# Recap ids come from the database identity column, so they double as the
+# timeline sequence and as the read cursor: a page is "the next `limit` ids
+# below the cursor", found with a binary search.
+#
+# Fan-out on write: publishing a recap adds its id to the author's timeline
+# and to every follower's timeline that is already built. Cold timelines are
+# not materialized; they are built from the database the first time the user
+# reads their feed, and rebuilt after `ttl` seconds.
+#
+# Fan-out on read: authors with more than `fanout_threshold` followers only
+# append to their own outbox. Readers merge the outboxes of the accounts they
+# follow into their timeline when paging.
+#
+# Two backends, as for the catalog cache:
+#   sqlite - (default) one SQLite file shared by every worker on the host, so
+#            a recap published through any worker reaches readers on all of
+#            them. `ttl` only has to catch recaps published on other hosts.
+#   memory - per process; a recap published through another worker shows up
+#            after the reader's timeline is rebuilt (`ttl`).
+
+
+def pack(ids):
+    return array("q", ids).tobytes()
+
+
+def unpack(blob):
+    ids = array("q")
+    ids.frombytes(blob)
+    return ids
+
+
+def add_capped(ids, recap_id, capacity):
+    """Insert into a sorted array('q'), dropping the oldest ids beyond capacity."""
+    position = bisect_left(ids, recap_id)
+    if position < len(ids) and ids[position] == recap_id:
+        return ids
+    insort(ids, recap_id)
+    if len(ids) > capacity:
+        del ids[:len(ids) - capacity]
+    return ids
+
+
+class MemoryStore:
+    def __init__(self, max_timelines):
+        self.max_timelines = max_timelines
+        # user_id -> (built_at, followee ids, recap ids)
+        self._timelines = OrderedDict()
+        # author_id -> recap ids, only for high-follower authors
+        self._outboxes = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._timelines.get(user_id)
+            if entry is None:
+                return None
+            self._timelines.move_to_end(user_id)
+            built_at, followees, ids = entry
+            return built_at, followees, array("q", ids)
+
+    def put(self, user_id, built_at, followees, ids):
+        with self._lock:
+            self._timelines[user_id] = (built_at, array("q", sorted(followees)), ids)
+            self._timelines.move_to_end(user_id)
+            while len(self._timelines) > self.max_timelines:
+                self._timelines.popitem(last=False)
+
+    def append(self, user_ids, recap_id, capacity):
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._timelines.get(user_id)
+                if entry is not None:
+                    add_capped(entry[2], recap_id, capacity)
+
+    def append_outbox(self, author_id, recap_id, capacity):
+        with self._lock:
+            add_capped(self._outboxes.setdefault(author_id, array("q")), recap_id, capacity)
+
+    def outboxes(self, author_ids):
+        with self._lock:
+            return [array("q", self._outboxes[a]) for a in author_ids if a in self._outboxes]
+
+
+class SqliteStore:
+    CHUNK = 500
+
+    def __init__(self, max_timelines, path):
+        self.max_timelines = max_timelines
+        self.path = path
+        self.db = LocalDatabase(self.path)
+        self._writes = 0
+        conn = self.db.conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS timelines ("
+                "user_id INTEGER PRIMARY KEY, built_at REAL NOT NULL, followees BLOB NOT NULL, ids BLOB NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS timelines_built_at ON timelines (built_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS outboxes (author_id INTEGER PRIMARY KEY, ids BLOB NOT NULL)")
+
+    def get(self, user_id):
+        row = self.db.conn().execute(
+            "SELECT built_at, followees, ids FROM timelines WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], unpack(row[1]), unpack(row[2])
+
+    def put(self, user_id, built_at, followees, ids):
+        conn = self.db.conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO timelines (user_id, built_at, followees, ids) VALUES (?, ?, ?, ?)",
+                (user_id, built_at, pack(sorted(followees)), ids.tobytes()),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                conn.execute(
+                    "DELETE FROM timelines WHERE user_id IN ("
+                    "SELECT user_id FROM timelines ORDER BY built_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_timelines,),
+                )
+
+    def append(self, user_ids, recap_id, capacity):
+        user_ids = list(user_ids)
+        conn = self.db.conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for start in range(0, len(user_ids), self.CHUNK):
+                chunk = user_ids[start:start + self.CHUNK]
+                rows = conn.execute(
+                    "SELECT user_id, ids FROM timelines WHERE user_id IN (%s)" % ",".join("?" * len(chunk)), chunk
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE timelines SET ids = ? WHERE user_id = ?",
+                    [(add_capped(unpack(ids), recap_id, capacity).tobytes(), user_id) for user_id, ids in rows],
+                )
+
+    def append_outbox(self, author_id, recap_id, capacity):
+        conn = self.db.conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT ids FROM outboxes WHERE author_id = ?", (author_id,)).fetchone()
+            ids = add_capped(unpack(row[0]) if row else array("q"), recap_id, capacity)
+            conn.execute("INSERT OR REPLACE INTO outboxes (author_id, ids) VALUES (?, ?)", (author_id, ids.tobytes()))
+
+    def outboxes(self, author_ids):
+        author_ids = list(author_ids)
+        result = []
+        for start in range(0, len(author_ids), self.CHUNK):
+            chunk = author_ids[start:start + self.CHUNK]
+            rows = self.db.conn().execute(
+                "SELECT ids FROM outboxes WHERE author_id IN (%s)" % ",".join("?" * len(chunk)), chunk
+            ).fetchall()
+            result.extend(unpack(row[0]) for row in rows)
+        return result
+
+
+class TimelineEngine:
+    def __init__(self, store, capacity=None, fanout_threshold=None, ttl=None):
+        self.store = store
+        self.capacity = capacity or int(os.environ.get("TIMELINE_CAPACITY", "200"))
+        self.fanout_threshold = fanout_threshold or int(os.environ.get("TIMELINE_FANOUT_THRESHOLD", "1000"))
+        self.ttl = ttl or float(os.environ.get("TIMELINE_TTL", "3600"))
+
+    def is_high_follower(self, follower_count):
+        return follower_count > self.fanout_threshold
+
+    def publish(self, recap_id, author_id, follower_ids, high_follower=False):
+        """Fan a new recap out to the author and (unless high_follower) their followers."""
+        if high_follower:
+            self.store.append_outbox(author_id, recap_id, self.capacity)
+            # The author always sees their own recap, outbox or not.
+            self.store.append([author_id], recap_id, self.capacity)
+        else:
+            self.store.append([author_id] + list(follower_ids), recap_id, self.capacity)
+
+    def build(self, user_id, recap_ids, followee_ids):
+        """Install a timeline built from the database (`recap_ids` in any order)."""
+        ids = array("q", sorted(set(recap_ids))[-self.capacity:])
+        self.store.put(user_id, time.time(), followee_ids, ids)
+
+    def read(self, user_id, cursor=None, limit=20):
+        """Return (recap_ids newest first, next_cursor), or None if the timeline must be (re)built."""
+        entry = self.store.get(user_id)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        _, followees, ids = entry
+        sources = [ids]
+        if followees:
+            sources.extend(self.store.outboxes(followees))
+
+        newest_first = []
+        for source in sources:
+            end = bisect_left(source, cursor) if cursor is not None else len(source)
+            # Each source contributes at most limit + 1 ids below the cursor.
+            newest_first.append(reversed(source[max(0, end - limit - 1):end]))
+        page, last = [], None
+        for recap_id in heapq.merge(*newest_first, reverse=True):
+            if recap_id == last:
+                continue
+            last = recap_id
+            page.append(recap_id)
+            if len(page) > limit:
+                break
+        next_cursor = page[limit - 1] if len(page) > limit else None
+        return page[:limit], next_cursor
+
+
+def engine_from_env():
+    max_timelines = int(os.environ.get("TIMELINE_MAX_USERS", "20000"))
+    backend = os.environ.get("TIMELINE_BACKEND", "sqlite").lower()
+    if backend == "sqlite":
+        path = os.environ.get("TIMELINE_PATH", "/tmp/cultivai_timelines.sqlite3")
+        return TimelineEngine(SqliteStore(max_timelines, path))
+    if backend != "memory":
+        raise Exception("Unknown TIMELINE_BACKEND: %s" % backend)
+    return TimelineEngine(MemoryStore(max_timelines))
+
+
+timelines = engine_from_env()
@@ -1 +1,51 @@
-# Placeholder for services/recap_utils.py
+from services.recap_timeline import timelines
+
+# Database helpers shared by the recap routes.
+#
+# Tables:
+#   recaps   (id bigint identity, user_id, content, image, created_at)
+#   follows  (follower_id, followee_id)
+
+
+def follower_ids(client, user_id):
+    """Return (follower ids, high_follower). Reads at most threshold + 1 rows."""
+    rows = client.table("follows").select("follower_id").eq("followee_id", user_id) \
+        .limit(timelines.fanout_threshold + 1).execute().data
+    if timelines.is_high_follower(len(rows)):
+        return [], True
+    return [row["follower_id"] for row in rows], False
+
+
+def followee_ids(client, user_id):
+    rows = client.table("follows").select("followee_id").eq("follower_id", user_id).execute().data
+    return [row["followee_id"] for row in rows]
+
+
+def recent_recap_ids(client, author_ids):
+    """Newest `capacity` recap ids by any of `author_ids`, oldest first."""
+    rows = client.table("recaps").select("id").in_("user_id", author_ids) \
+        .order("id", desc=True).limit(timelines.capacity).execute().data
+    return [row["id"] for row in reversed(rows)]
+
+
+def read_feed(client, user_id, cursor=None, limit=20):
+    """Page of the user's timeline, building it from the database if it is missing or stale."""
+    page = timelines.read(user_id, cursor, limit)
+    if page is None:
+        followees = followee_ids(client, user_id)
+        authors = list(set(followees) | {user_id})
+        timelines.build(user_id, recent_recap_ids(client, authors), followees)
+        page = timelines.read(user_id, cursor, limit)
+        if page is None:
+            # Only if the store evicted it again before the read, e.g. under heavy churn.
+            raise Exception("Timeline for user %s could not be stored, try again" % user_id)
+    return page
+
+
+def fetch_recaps(client, recap_ids):
+    """Recap rows for `recap_ids`, in the same order."""
+    if not recap_ids:
+        return []
+    rows = client.table("recaps").select("*").in_("id", recap_ids).execute().data
+    by_id = {row["id"]: row for row in rows}
+    return [by_id[recap_id] for recap_id in recap_ids if recap_id in by_id]
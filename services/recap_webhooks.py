@@ -1 +1,403 @@
-# Placeholder for services/recap_webhooks.py
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from services.sqlite_local import LocalDatabase
+
+# Queued, batched webhook delivery.
+#
+# Request handlers only call `enqueue()`, which writes one row per subscribed
+# endpoint into a local SQLite queue and returns. The worker in
+# tasks/webhook_worker.py drains the queue:
+#
+#   - events for the same endpoint are POSTed together, up to `batch_size`
+#     per request, as {"events": [...]}
+#   - a bounded thread pool sends the requests, with at most
+#     `endpoint_concurrency` requests in flight per endpoint
+#   - failed batches are retried with exponential backoff and full jitter and
+#     dropped to the "dead" state after `max_attempts`; dead events can be
+#     listed and requeued through /api/tasks/webhooks/dead and are purged
+#     after WEBHOOK_DEAD_RETENTION seconds
+#   - an endpoint that keeps failing trips its circuit breaker and is skipped
+#     until the cooldown passes; then a single trial batch decides whether it
+#     closes again
+#
+# Rows being delivered are leased; if the worker dies mid-delivery the lease
+# expires and the rows are picked up again, so delivery is at-least-once and
+# subscribers should dedupe on the event id.
+#
+# Endpoints come from RECAP_WEBHOOK_URLS (comma-separated), so pointing it at
+# a local HTTP sink is enough to exercise the whole path;
+# benchmarks/webhook_delivery.py does exactly that.
+
+log = logging.getLogger(__name__)
+
+
+def endpoints_from_env():
+    return [url.strip() for url in os.environ.get("RECAP_WEBHOOK_URLS", "").split(",") if url.strip()]
+
+
+class WebhookQueue:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("WEBHOOK_QUEUE_PATH", "/tmp/cultivai_webhooks.sqlite3")
+        self.history = int(os.environ.get("WEBHOOK_LATENCY_HISTORY", "5000"))
+        self.dead_retention = float(os.environ.get("WEBHOOK_DEAD_RETENTION", str(7 * 24 * 3600)))
+        self.db = LocalDatabase(self.path)
+        conn = self.db.conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, endpoint TEXT NOT NULL, event_type TEXT NOT NULL, "
+                "payload TEXT NOT NULL, created_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt REAL NOT NULL, state TEXT NOT NULL DEFAULT 'queued', leased_until REAL, "
+                "last_error TEXT)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS webhook_events_due ON webhook_events (state, endpoint, next_attempt)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_deliveries ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, endpoint TEXT NOT NULL, ok INTEGER NOT NULL, "
+                "events INTEGER NOT NULL, latency_ms REAL NOT NULL, queued_ms REAL NOT NULL, finished_at REAL NOT NULL)"
+            )
+
+    def enqueue(self, event_type, payload, endpoints):
+        if not endpoints:
+            return 0
+        now = time.time()
+        body = json.dumps(payload, separators=(",", ":"), default=str)
+        conn = self.db.conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO webhook_events (endpoint, event_type, payload, created_at, next_attempt) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(endpoint, event_type, body, now, now) for endpoint in endpoints],
+            )
+        return len(endpoints)
+
+    def due_endpoints(self):
+        rows = self.db.conn().execute(
+            "SELECT DISTINCT endpoint FROM webhook_events WHERE state = 'queued' AND next_attempt <= ?",
+            (time.time(),),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, endpoint, limit, lease):
+        """Lease up to `limit` due events for one endpoint, oldest first."""
+        now = time.time()
+        conn = self.db.conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, event_type, payload, created_at, attempts FROM webhook_events "
+                "WHERE state = 'queued' AND endpoint = ? AND next_attempt <= ? ORDER BY id LIMIT ?",
+                (endpoint, now, limit),
+            ).fetchall()
+            if rows:
+                conn.execute(
+                    "UPDATE webhook_events SET state = 'delivering', leased_until = ? WHERE id IN (%s)"
+                    % ",".join("?" * len(rows)),
+                    [now + lease] + [row[0] for row in rows],
+                )
+        return [
+            {"id": row[0], "type": row[1], "payload": json.loads(row[2]), "created_at": row[3], "attempts": row[4]}
+            for row in rows
+        ]
+
+    def reclaim_expired(self):
+        conn = self.db.conn()
+        with conn:
+            return conn.execute(
+                "UPDATE webhook_events SET state = 'queued', leased_until = NULL "
+                "WHERE state = 'delivering' AND leased_until < ?",
+                (time.time(),),
+            ).rowcount
+
+    def ack(self, ids):
+        conn = self.db.conn()
+        with conn:
+            conn.execute("DELETE FROM webhook_events WHERE id IN (%s)" % ",".join("?" * len(ids)), ids)
+
+    def retry(self, events, next_attempt, error, max_attempts):
+        conn = self.db.conn()
+        with conn:
+            for event in events:
+                attempts = event["attempts"] + 1
+                state = "dead" if attempts >= max_attempts else "queued"
+                conn.execute(
+                    "UPDATE webhook_events SET state = ?, attempts = ?, next_attempt = ?, "
+                    "leased_until = NULL, last_error = ? WHERE id = ?",
+                    (state, attempts, next_attempt(attempts), error, event["id"]),
+                )
+
+    def dead(self, limit=100):
+        rows = self.db.conn().execute(
+            "SELECT id, endpoint, event_type, created_at, attempts, last_error FROM webhook_events "
+            "WHERE state = 'dead' ORDER BY id LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [
+            {"id": row[0], "endpoint": row[1], "type": row[2], "created_at": row[3], "attempts": row[4],
+             "last_error": row[5]}
+            for row in rows
+        ]
+
+    def requeue_dead(self, ids=None):
+        """Give dead events (all of them, or just `ids`) a fresh set of attempts. Returns how many."""
+        query = "UPDATE webhook_events SET state = 'queued', attempts = 0, next_attempt = ? WHERE state = 'dead'"
+        params = [time.time()]
+        if ids is not None:
+            if not ids:
+                return 0
+            query += " AND id IN (%s)" % ",".join("?" * len(ids))
+            params.extend(ids)
+        conn = self.db.conn()
+        with conn:
+            return conn.execute(query, params).rowcount
+
+    def purge_dead(self):
+        conn = self.db.conn()
+        with conn:
+            return conn.execute(
+                "DELETE FROM webhook_events WHERE state = 'dead' AND created_at < ?",
+                (time.time() - self.dead_retention,),
+            ).rowcount
+
+    def record_delivery(self, endpoint, ok, events, latency_ms, queued_ms):
+        conn = self.db.conn()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO webhook_deliveries (endpoint, ok, events, latency_ms, queued_ms, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (endpoint, int(ok), events, latency_ms, queued_ms, time.time()),
+            )
+            conn.execute("DELETE FROM webhook_deliveries WHERE id <= ?", (cursor.lastrowid - self.history,))
+
+    def stats(self):
+        conn = self.db.conn()
+        depth = dict(conn.execute("SELECT state, COUNT(*) FROM webhook_events GROUP BY state").fetchall())
+        oldest = conn.execute("SELECT MIN(created_at) FROM webhook_events WHERE state != 'dead'").fetchone()[0]
+        rows = conn.execute("SELECT ok, events, latency_ms, queued_ms FROM webhook_deliveries").fetchall()
+        latencies = sorted(row[2] for row in rows)
+        queued = sorted(row[3] for row in rows)
+        return {
+            "queue_depth": {state: depth.get(state, 0) for state in ("queued", "delivering", "dead")},
+            "oldest_pending_age_s": round(time.time() - oldest, 3) if oldest else 0,
+            "recent_deliveries": len(rows),
+            "recent_failures": sum(1 for row in rows if not row[0]),
+            "recent_events_delivered": sum(row[1] for row in rows if row[0]),
+            "request_latency_ms": percentiles(latencies),
+            "end_to_end_latency_ms": percentiles(queued),
+        }
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    def pick(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))], 2)
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(values[-1], 2)}
+
+
+class CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class Dispatcher:
+    def __init__(self, queue, workers=None, batch_size=None, endpoint_concurrency=None, max_attempts=None,
+                 timeout=None, backoff_base=None, backoff_cap=None, breaker_threshold=None,
+                 breaker_cooldown=None, poll_interval=None):
+        env = os.environ.get
+        self.queue = queue
+        self.workers = workers or int(env("WEBHOOK_WORKERS", "8"))
+        self.batch_size = batch_size or int(env("WEBHOOK_BATCH_SIZE", "50"))
+        self.endpoint_concurrency = endpoint_concurrency or int(env("WEBHOOK_ENDPOINT_CONCURRENCY", "2"))
+        self.max_attempts = max_attempts or int(env("WEBHOOK_MAX_ATTEMPTS", "8"))
+        self.timeout = timeout or float(env("WEBHOOK_TIMEOUT", "5"))
+        self.backoff_base = backoff_base or float(env("WEBHOOK_BACKOFF_BASE", "1"))
+        self.backoff_cap = backoff_cap or float(env("WEBHOOK_BACKOFF_CAP", "300"))
+        self.breaker_threshold = breaker_threshold or int(env("WEBHOOK_BREAKER_THRESHOLD", "5"))
+        self.breaker_cooldown = breaker_cooldown or float(env("WEBHOOK_BREAKER_COOLDOWN", "30"))
+        self.poll_interval = poll_interval or float(env("WEBHOOK_POLL_INTERVAL", "0.5"))
+        self.lease = self.timeout * 3
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="webhook")
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._total_in_flight = 0
+        self._breakers = {}
+        self._sessions = threading.local()
+        self._stop = threading.Event()
+
+    def next_attempt(self, attempts):
+        # Full jitter: uniform in [0, min(cap, base * 2^attempts)).
+        return time.time() + random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempts))
+
+    def _session(self):
+        session = getattr(self._sessions, "session", None)
+        if session is None:
+            session = self._sessions.session = requests.Session()
+        return session
+
+    def _breaker(self, endpoint):
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+        return breaker
+
+    def dispatch_once(self):
+        """Hand every due endpoint with spare capacity one batch. Returns how many batches were started."""
+        started = 0
+        for endpoint in self.queue.due_endpoints():
+            with self._lock:
+                if self._total_in_flight >= self.workers:
+                    break
+                if self._in_flight.get(endpoint, 0) >= self.endpoint_concurrency:
+                    continue
+                if not self._breaker(endpoint).allow():
+                    continue
+                self._in_flight[endpoint] = self._in_flight.get(endpoint, 0) + 1
+                self._total_in_flight += 1
+            try:
+                events = self.queue.claim(endpoint, self.batch_size, self.lease)
+            except Exception:
+                self._done(endpoint, None)
+                raise
+            if not events:
+                self._done(endpoint, None)
+                continue
+            self._pool.submit(self._deliver, endpoint, events)
+            started += 1
+        return started
+
+    def _done(self, endpoint, ok):
+        with self._lock:
+            self._in_flight[endpoint] -= 1
+            self._total_in_flight -= 1
+            breaker = self._breaker(endpoint)
+            if ok is True:
+                breaker.success()
+            elif ok is False:
+                breaker.failure()
+            else:
+                breaker.trial_running = False
+
+    def _deliver(self, endpoint, events):
+        body = {"events": [
+            {"id": e["id"], "type": e["type"], "created_at": e["created_at"], "payload": e["payload"]}
+            for e in events
+        ]}
+        start = time.time()
+        error = None
+        try:
+            response = self._session().post(endpoint, json=body, timeout=self.timeout)
+            if not 200 <= response.status_code < 300:
+                error = "HTTP %d" % response.status_code
+        except requests.RequestException as e:
+            error = str(e) or e.__class__.__name__
+        finished = time.time()
+        if error is not None:
+            log.warning("Delivering %d events to %s failed: %s", len(events), endpoint, error)
+        try:
+            if error is None:
+                self.queue.ack([e["id"] for e in events])
+            else:
+                self.queue.retry(events, self.next_attempt, error, self.max_attempts)
+            self.queue.record_delivery(
+                endpoint, error is None, len(events), (finished - start) * 1000,
+                (finished - min(e["created_at"] for e in events)) * 1000,
+            )
+        except Exception:
+            # Nobody checks the pool's futures; without this the events just sit
+            # leased until the lease runs out.
+            log.exception("Failed to record the outcome of %d events for %s, they are retried after the lease "
+                          "expires", len(events), endpoint)
+        finally:
+            self._done(endpoint, error is None)
+
+    def run(self):
+        last_reclaim = 0
+        while not self._stop.is_set():
+            if time.monotonic() - last_reclaim > self.lease:
+                self.queue.reclaim_expired()
+                purged = self.queue.purge_dead()
+                if purged:
+                    log.info("Purged %d dead webhook events", purged)
+                last_reclaim = time.monotonic()
+            if not self.dispatch_once():
+                self._stop.wait(self.poll_interval)
+
+    def request_stop(self):
+        self._stop.set()
+
+    def stopping(self, timeout=0):
+        """Wait up to `timeout` seconds for a stop request; True once one was made."""
+        return self._stop.wait(timeout)
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._pool.shutdown(wait=wait)
+
+    def breaker_states(self):
+        with self._lock:
+            return {endpoint: breaker.state for endpoint, breaker in self._breakers.items()}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = WebhookQueue()
+    return _queue
+
+
+def enqueue(event_type, payload, endpoints=None):
+    """Queue `payload` for every subscribed endpoint. Cheap enough to call from a request handler."""
+    if endpoints is None:
+        endpoints = endpoints_from_env()
+    if not endpoints:
+        return 0
+    return get_queue().enqueue(event_type, payload, endpoints)
@@ -0,0 +1,29 @@
+import os
+import sqlite3
+import threading
+
+# Host-local SQLite files shared by every worker on the machine (catalog
+# cache, recap timelines, webhook queue).
+#
+# Each thread gets its own connection in autocommit mode; stores open their
+# transactions explicitly with BEGIN IMMEDIATE. WAL lets readers run while a
+# writer commits, and a writer waits up to SQLITE_BUSY_TIMEOUT seconds for
+# the lock before sqlite3 raises "database is locked".
+
+BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", "5"))
+
+
+class LocalDatabase:
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = timeout or BUSY_TIMEOUT
+        self._local = threading.local()
+
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
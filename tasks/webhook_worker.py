@@ -0,0 +1,47 @@
+import json
+import logging
+import signal
+import threading
+
+from services.recap_webhooks import Dispatcher, get_queue
+
+# Drains the recap webhook queue (see services/recap_webhooks.py).
+#
+#   python -m tasks.webhook_worker
+#
+# Run one per host; it shares WEBHOOK_QUEUE_PATH with the web workers.
+
+log = logging.getLogger("webhook_worker")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    queue = get_queue()
+    dispatcher = Dispatcher(queue)
+
+    def shutdown(signum, frame):
+        log.info("Stopping, waiting for in-flight deliveries")
+        dispatcher.request_stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    def report():
+        while not dispatcher.stopping(60):
+            stats = queue.stats()
+            stats["breakers"] = dispatcher.breaker_states()
+            log.info("stats %s", json.dumps(stats))
+
+    threading.Thread(target=report, daemon=True).start()
+    log.info("Delivering from %s with %d workers", queue.path, dispatcher.workers)
+    while not dispatcher.stopping():
+        try:
+            dispatcher.run()
+        except Exception:
+            log.exception("Dispatcher loop failed, restarting")
+            dispatcher.stopping(dispatcher.poll_interval)
+    dispatcher.stop()
+
+
+if __name__ == "__main__":
+    main()